@@ -6,9 +6,11 @@ Provides a REST API using FastAPI for web-based interaction
 
 import os
 import sys
+import asyncio
 from typing import Optional, List
 from fastapi import FastAPI, UploadFile, File, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import logging
 from dotenv import load_dotenv
@@ -22,6 +24,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 from src.llm_agent import PressureValveAgent, create_agent
 from src.data_processor import DataProcessor
 from src.web_collector import WebDataCollector
+from backend.app.utils.uploads import save_upload_file
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -31,7 +34,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Pressure Relief Valve Expert API",
     description="API for the Pressure Relief Valve LLM Agent",
-    version="0.1.0"
+    version="0.1.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -98,6 +102,7 @@ async def root():
         "endpoints": {
             "query": "/api/query",
             "upload": "/api/upload",
+            "upload_batch": "/api/upload/batch",
             "collect": "/api/collect",
             "stats": "/api/stats"
         }
@@ -118,7 +123,8 @@ async def query(request: QueryRequest):
     try:
         logger.info(f"Processing query: {request.question}")
         
-        result = agent.query(request.question)
+        # Blocking model/vector-store work runs in a worker thread to keep the event loop free
+        result = await asyncio.to_thread(agent.query, request.question)
         
         # Extract source information
         sources = []
@@ -129,7 +135,7 @@ async def query(request: QueryRequest):
         
         return QueryResponse(
             answer=result['answer'],
-            sources=list(set(sources))  # Remove duplicates
+            sources=list(dict.fromkeys(sources))  # Remove duplicates, keep retrieval order
         )
         
     except Exception as e:
@@ -151,18 +157,18 @@ async def upload_file(file: UploadFile = File(...)):
     try:
         logger.info(f"Uploading file: {file.filename}")
         
-        # Save the file
-        file_content = await file.read()
-        file_path = data_processor.save_upload(file_content, file.filename)
+        # Stream the file to disk instead of buffering it in memory
+        file_path = await save_upload_file(file, str(data_processor.upload_dir / file.filename))
+        logger.info(f"Saved upload: {file_path}")
         
         # Process and ingest
-        documents = data_processor.process_file(file_path)
-        metadata = [{'source': file.filename, 'type': 'uploaded_dataset'}] * len(documents)
-        agent.ingest_documents(documents, metadata)
+        documents = await asyncio.to_thread(data_processor.process_file, file_path)
+        metadata = {'source': file.filename, 'type': 'uploaded_dataset'}
+        count = await asyncio.to_thread(agent.ingest_documents, documents, metadata)
         
         return StatusResponse(
             status="success",
-            message=f"Successfully uploaded and processed {len(documents)} documents"
+            message=f"Successfully uploaded and processed {count} documents"
         )
         
     except Exception as e:
@@ -170,6 +176,43 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/upload/batch", response_model=StatusResponse)
+async def upload_files(files: List[UploadFile] = File(...)):
+    """
+    Upload several dataset files and process them in parallel
+    
+    Args:
+        files: Files to upload
+        
+    Returns:
+        Status message
+    """
+    try:
+        logger.info(f"Uploading {len(files)} files")
+        
+        file_paths = []
+        for file in files:
+            file_paths.append(await save_upload_file(file, str(data_processor.upload_dir / file.filename)))
+        
+        # Parse all files across worker threads, then ingest in one pass
+        results = await asyncio.to_thread(data_processor.process_files, file_paths)
+        documents = []
+        metadata = []
+        for file, docs in zip(files, results):
+            documents.extend(docs)
+            metadata.extend([{'source': file.filename, 'type': 'uploaded_dataset'}] * len(docs))
+        await asyncio.to_thread(agent.ingest_documents, documents, metadata)
+        
+        return StatusResponse(
+            status="success",
+            message=f"Successfully uploaded and processed {len(documents)} documents from {len(files)} files"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error uploading files: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/api/collect", response_model=StatusResponse)
 async def collect_web_data(topics: Optional[List[str]] = None):
     """
@@ -185,16 +228,16 @@ async def collect_web_data(topics: Optional[List[str]] = None):
         logger.info("Collecting web data...")
         
         # Get technical documentation
-        docs = web_collector.get_technical_documentation()
+        docs = await asyncio.to_thread(web_collector.get_technical_documentation)
         
         # Optionally collect specific topics
         if topics:
-            web_docs = web_collector.collect_valve_information(topics)
+            web_docs = await asyncio.to_thread(web_collector.collect_valve_information, topics)
             docs.extend(web_docs)
         
         # Ingest documents
         metadata = [{'source': 'web', 'type': 'technical_documentation'}] * len(docs)
-        agent.ingest_documents(docs, metadata)
+        await asyncio.to_thread(agent.ingest_documents, docs, metadata)
         
         return StatusResponse(
             status="success",
@@ -15,9 +15,13 @@ class Settings(BaseSettings):
 
     # Embeddings
     embedding_provider: str = Field(default=os.getenv("EMBEDDING_PROVIDER", "local"))  # 'local' | 'openai'
+    embedding_backend: str = Field(default=os.getenv("EMBEDDING_BACKEND", "st"))  # local runtime: 'st' | 'fastembed'
     sentence_transformer_model: str = Field(default=os.getenv("SENTENCE_TRANSFORMER_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
     openai_api_key: Optional[str] = Field(default=os.getenv("OPENAI_API_KEY"))
     openai_embedding_model: str = Field(default=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"))
+    openai_embedding_concurrency: int = Field(default=int(os.getenv("OPENAI_EMBEDDING_CONCURRENCY", "8")))  # in-flight batch requests
+    embedding_batch_size: int = Field(default=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")))
+    embedding_batch_wait_ms: float = Field(default=float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "10")))  # 0 disables coalescing
 
     # LLM
     llm_provider: str = Field(default=os.getenv("LLM_PROVIDER", "openai"))  # 'openai' | 'ollama'
@@ -28,6 +32,9 @@ class Settings(BaseSettings):
     vector_store_provider: str = Field(default=os.getenv("VECTOR_STORE_PROVIDER", "chroma"))  # 'chroma' | 'pgvector'
     chroma_persist_path: str = Field(default=os.getenv("CHROMA_PERSIST_PATH", "/workspace/data/chroma"))
     chroma_collection: str = Field(default=os.getenv("CHROMA_COLLECTION", "prv-knowledge"))
+    # HNSW build parameters; only applied when the collection is first created
+    chroma_hnsw_construction_ef: int = Field(default=int(os.getenv("CHROMA_HNSW_CONSTRUCTION_EF", "200")))
+    chroma_hnsw_m: int = Field(default=int(os.getenv("CHROMA_HNSW_M", "32")))
 
     # Supabase / Postgres (pgvector)
     supabase_url: Optional[str] = Field(default=os.getenv("SUPABASE_URL"))
@@ -45,19 +52,43 @@ class Settings(BaseSettings):
     # Embedding/vector settings for pgvector
     embedding_dim: int = Field(default=int(os.getenv("EMBEDDING_DIM", "384")))  # 384 (MiniLM) or 1536 (OpenAI small), etc.
     pgvector_distance: str = Field(default=os.getenv("PGVECTOR_DISTANCE", "cosine"))  # 'cosine' | 'l2' | 'ip'
-    pgvector_ivfflat_lists: int = Field(default=int(os.getenv("PGVECTOR_IVFFLAT_LISTS", "100")))
+    # Store embeddings as halfvec (FP16): half the storage and bandwidth per distance probe.
+    # Applies when the documents table is created; existing vector columns are left as-is.
+    pgvector_halfvec: bool = Field(default=os.getenv("PGVECTOR_HALFVEC", "false").lower() in ("1", "true", "yes"))
+    pgvector_index_type: str = Field(default=os.getenv("PGVECTOR_INDEX_TYPE", "hnsw"))  # 'hnsw' | 'ivfflat'
+    pgvector_ivfflat_lists: int = Field(default=int(os.getenv("PGVECTOR_IVFFLAT_LISTS", "0")))  # 0 = from row count
+    pgvector_maintenance_workers: int = Field(default=int(os.getenv("PGVECTOR_MAINTENANCE_WORKERS", "7")))  # parallel index build workers
+    # maintenance_work_mem for ANN index builds, e.g. '2GB'; unset keeps the server default
+    pgvector_maintenance_work_mem: Optional[str] = Field(default=os.getenv("PGVECTOR_MAINTENANCE_WORK_MEM"))
+    pgvector_ivfflat_probes: int = Field(default=int(os.getenv("PGVECTOR_IVFFLAT_PROBES", "0")))  # 0 = sqrt(lists)
+    # 0 = pick from row count at index build time (see configure_hnsw_params)
+    hnsw_m: int = Field(default=int(os.getenv("HNSW_M", "0")))
+    hnsw_ef_construction: int = Field(default=int(os.getenv("HNSW_EF_CONSTRUCTION", "0")))
+    hnsw_ef_search: int = Field(default=int(os.getenv("HNSW_EF_SEARCH", "40")))
 
     # Chunking
     chunk_size_tokens: int = Field(default=int(os.getenv("CHUNK_SIZE_TOKENS", "400")))
     chunk_overlap_tokens: int = Field(default=int(os.getenv("CHUNK_OVERLAP_TOKENS", "60")))
+    chunk_strategy: str = Field(default=os.getenv("CHUNK_STRATEGY", "tokens"))  # 'tokens' (exact) | 'chars' (approximate, faster)
 
     # Retrieval/Generation
     top_k: int = Field(default=int(os.getenv("TOP_K", "8")))
     max_context_tokens: int = Field(default=int(os.getenv("MAX_CONTEXT_TOKENS", "6000")))
 
+    # Answer cache (exact + semantic hits on repeated questions)
+    answer_cache_size: int = Field(default=int(os.getenv("ANSWER_CACHE_SIZE", "1024")))  # 0 disables
+    answer_cache_threshold: float = Field(default=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")))
+    answer_cache_ttl_seconds: float = Field(default=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")))
+
+    # pgvector retrieval cache (skips the ANN round-trip for near-identical queries)
+    query_cache_size: int = Field(default=int(os.getenv("QUERY_CACHE_SIZE", "1024")))  # 0 disables
+    query_cache_threshold: float = Field(default=float(os.getenv("QUERY_CACHE_THRESHOLD", "0.97")))
+    query_cache_ttl_seconds: float = Field(default=float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600")))
+
     # Crawling
     default_max_pages: int = Field(default=int(os.getenv("DEFAULT_MAX_PAGES", "100")))
     default_allowed_domains: List[str] = Field(default_factory=list)
+    crawl_concurrency: int = Field(default=int(os.getenv("CRAWL_CONCURRENCY", "16")))
 
 
 @lru_cache(maxsize=1)
@@ -1,13 +1,16 @@
 from __future__ import annotations
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from backend.app.core.config import get_settings
 from backend.app.routers.api import router as api_router
+from backend.app.services.ingest import seed_seen_chunks
 
 
 settings = get_settings()
 
-app = FastAPI(title=settings.app_name)
+app = FastAPI(title=settings.app_name, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +23,15 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api")
 
 
+@app.on_event("startup")
+def load_ingest_state():
+    try:
+        seed_seen_chunks()
+    except Exception:
+        # Ingest still dedups correctly without the filter, just with a store lookup per chunk
+        logging.getLogger(__name__).exception("Could not seed seen-chunk filter from the vector store")
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
@@ -1,43 +1,63 @@
 from __future__ import annotations
 from typing import List, Dict, Any
+from itertools import islice, zip_longest
 from backend.app.core.config import get_settings
 from backend.app.services.vectorstore import get_vector_store
 from backend.app.services.embeddings import embed_texts
 from backend.app.services.llm import generate_response
+from backend.app.services.cache import LRUEmbeddingCache
 
 _settings = get_settings()
+_TOP_K = _settings.top_k
 
+_answer_cache = LRUEmbeddingCache(
+    capacity=_settings.answer_cache_size,
+    threshold=_settings.answer_cache_threshold,
+    ttl_seconds=_settings.answer_cache_ttl_seconds,
+)
 
-def _make_system_prompt() -> str:
-    return (
-        "You are a specialist engineer for industrial pressure relief valves (PRV). "
-        "You analyze requirements (process fluid, set pressure, temperature, flow rate, code/standard like ASME/API), materials, and certifications. "
-        "Use only provided context documents and your domain knowledge to recommend options, trade-offs, sizing approaches, and standards compliance. "
-        "Return clear, actionable guidance with assumptions, and cite sources by their source URI when relevant."
-    )
+
+def invalidate_answer_cache() -> None:
+    """Drop cached answers; call after every successful write to the index."""
+    _answer_cache.clear()
+
+
+# Invariant prompt text is built once and placed first so every request shares a
+# byte-identical prefix, which provider-side prompt caching can reuse.
+_SYSTEM_PROMPT = (
+    "You are a specialist engineer for industrial pressure relief valves (PRV). "
+    "You analyze requirements (process fluid, set pressure, temperature, flow rate, code/standard like ASME/API), materials, and certifications. "
+    "Use only provided context documents and your domain knowledge to recommend options, trade-offs, sizing approaches, and standards compliance. "
+    "Return clear, actionable guidance with assumptions, and cite sources by their source URI when relevant."
+)
+
+_RAG_INSTRUCTIONS = (
+    "Answer the user question using only the CONTEXT. "
+    "If the answer is not in the context, say you do not have sufficient information. "
+    "Include a short bullet list of recommended next steps."
+)
 
 
 def _build_rag_prompt(query: str, contexts: List[str], metadatas: List[Dict[str, Any]]) -> str:
-    sources_list = []
-    for md in metadatas:
-        src = md.get("source") if isinstance(md, dict) else None
-        if src and src not in sources_list:
-            sources_list.append(src)
+    # Order-preserving dedupe in one hashed pass
+    sources_list = list(dict.fromkeys(md["source"] for md in metadatas if isinstance(md, dict) and md.get("source")))
     context_text = "\n\n".join(contexts)
     sources_text = "\n".join(f"- {s}" for s in sources_list)
-    instructions = (
-        "Answer the user question using only the CONTEXT. "
-        "If the answer is not in the context, say you do not have sufficient information. "
-        "Include a short bullet list of recommended next steps."
-    )
-    return f"CONTEXT:\n{context_text}\n\nSOURCES:\n{sources_text}\n\nQUESTION:\n{query}\n\n{instructions}"
+    return f"{_RAG_INSTRUCTIONS}\n\nCONTEXT:\n{context_text}\n\nSOURCES:\n{sources_text}\n\nQUESTION:\n{query}"
 
 
 def answer_query(query: str, top_k: int | None = None) -> Dict[str, Any]:
     vs = get_vector_store()
-    k = top_k or _settings.top_k
+    k = top_k or _TOP_K
+    generation = _answer_cache.generation
+    cached = _answer_cache.get_exact(query, k)
+    if cached is not None:
+        return cached
     # Embed query to align with precomputed embeddings for better accuracy
     q_emb = embed_texts([query])
+    cached = _answer_cache.get_similar(k, q_emb[0])
+    if cached is not None:
+        return cached
     results = vs.query(query_embeddings=q_emb, n_results=k)
     documents: List[str] = results.get("documents", [[]])[0]
     metadatas: List[Dict[str, Any]] = results.get("metadatas", [[]])[0]
@@ -45,20 +65,19 @@ def answer_query(query: str, top_k: int | None = None) -> Dict[str, Any]:
     distances: List[float] = results.get("distances", [[]])[0]
 
     prompt = _build_rag_prompt(query, documents, metadatas)
-    system_prompt = _make_system_prompt()
-    answer = generate_response(prompt, system=system_prompt)
+    answer = generate_response(prompt, system=_SYSTEM_PROMPT)
 
     # Build sources
     sources = []
-    for i in range(len(documents)):
-        snippet = documents[i][:400]
-        src = metadatas[i].get("source") if i < len(metadatas) else None
-        score = 1.0 - distances[i] if i < len(distances) else None
+    rows = islice(zip_longest(documents, metadatas, ids, distances), len(documents))
+    for i, (doc, md, doc_id, dist) in enumerate(rows):
         sources.append({
-            "id": ids[i] if i < len(ids) else f"doc-{i}",
-            "uri": src,
-            "score": score,
-            "snippet": snippet,
+            "id": doc_id if doc_id is not None else f"doc-{i}",
+            "uri": md.get("source") if md else None,
+            "score": 1.0 - dist if dist is not None else None,
+            "snippet": doc[:400],
         })
 
-    return {"answer": answer, "sources": sources}
\ No newline at end of file
+    result = {"answer": answer, "sources": sources}
+    _answer_cache.put(query, k, q_emb[0], result, generation=generation)
+    return result
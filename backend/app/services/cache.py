@@ -0,0 +1,135 @@
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import threading
+import time
+import numpy as np
+from backend.app.utils.quantize import int8_scores, quantize_int8
+
+# Candidates from the coarse int8 pass that are rescored against the FP16 copy
+_RERANK_CANDIDATES = 4
+
+
+def _hash_key(query: str, top_k: int) -> str:
+    return hashlib.sha256(f"{top_k}\x00{query}".encode("utf-8")).hexdigest()
+
+
+class LRUEmbeddingCache:
+    """Two-layer answer cache: exact (query, top_k) hits plus cosine-similar query hits.
+
+    Query embeddings are kept in a fixed (capacity, dim) int8 matrix so a semantic lookup
+    is a single integer matrix-vector product; the best few candidates are rescored
+    against an FP16 copy before applying the threshold. Embeddings are expected to be
+    L2-normalized.
+    """
+
+    def __init__(self, capacity: int = 1024, threshold: float = 0.95, ttl_seconds: float = 3600.0) -> None:
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # key -> (slot, answer, inserted_at)
+        self._entries: "OrderedDict[str, Tuple[int, Dict[str, Any], float]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_f16: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[str]] = [None] * capacity
+        self._slot_top_k = np.full(capacity, -1, dtype=np.int64)
+        self._free_slots: List[int] = list(range(capacity - 1, -1, -1))
+        # Bumped by clear() so answers computed against the old index are not stored afterwards
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _expired(self, inserted_at: float) -> bool:
+        return self.ttl_seconds > 0 and (time.monotonic() - inserted_at) > self.ttl_seconds
+
+    def _evict(self, key: str) -> None:
+        slot, _, _ = self._entries.pop(key)
+        self._slot_keys[slot] = None
+        self._slot_top_k[slot] = -1
+        if self._matrix is not None:
+            self._matrix[slot] = 0
+            self._matrix_f16[slot] = 0.0
+        self._free_slots.append(slot)
+
+    def get_exact(self, query: str, top_k: int) -> Optional[Dict[str, Any]]:
+        if self.capacity <= 0:
+            return None
+        key = _hash_key(query, top_k)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[2]):
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get_similar(self, top_k: int, embedding: Sequence[float]) -> Optional[Dict[str, Any]]:
+        if self.capacity <= 0:
+            return None
+        with self._lock:
+            if self._matrix is None or not self._entries:
+                return None
+            q = np.asarray(embedding, dtype=np.float32)
+            coarse = int8_scores(self._matrix, quantize_int8(q)).astype(np.int64)
+            eligible = self._slot_top_k == top_k
+            if not eligible.any():
+                return None
+            coarse[~eligible] = np.iinfo(np.int64).min
+            n = min(_RERANK_CANDIDATES, coarse.shape[0])
+            candidates = np.argpartition(coarse, -n)[-n:]
+            candidates = candidates[eligible[candidates]]
+            scores = self._matrix_f16[candidates].astype(np.float32) @ q
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            slot = int(candidates[best])
+            key = self._slot_keys[slot]
+            if key is None:
+                return None
+            entry = self._entries[key]
+            if self._expired(entry[2]):
+                self._evict(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(
+        self,
+        query: str,
+        top_k: int,
+        embedding: Sequence[float],
+        answer: Dict[str, Any],
+        generation: Optional[int] = None,
+    ) -> None:
+        if self.capacity <= 0:
+            return
+        q = np.asarray(embedding, dtype=np.float32)
+        key = _hash_key(query, top_k)
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, q.shape[0]), dtype=np.int8)
+                self._matrix_f16 = np.zeros((self.capacity, q.shape[0]), dtype=np.float16)
+            if key in self._entries:
+                self._evict(key)
+            elif not self._free_slots:
+                self._evict(next(iter(self._entries)))
+            slot = self._free_slots.pop()
+            self._matrix[slot] = quantize_int8(q)
+            self._matrix_f16[slot] = q
+            self._slot_keys[slot] = key
+            self._slot_top_k[slot] = top_k
+            self._entries[key] = (slot, answer, time.monotonic())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            for key in list(self._entries):
+                self._evict(key)
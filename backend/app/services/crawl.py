@@ -1,52 +1,97 @@
 from __future__ import annotations
 from typing import List, Set, Tuple
-from urllib.parse import urljoin, urlparse
-import requests
-from bs4 import BeautifulSoup
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+import asyncio
+import re
+import httpx
+from selectolax.parser import HTMLParser
+from backend.app.core.config import get_settings
 from backend.app.services.ingest import _chunk_and_index
 
+_settings = get_settings()
 
-def _same_domain_str(url: str, allowed: Set[str]) -> bool:
-    hostname = urlparse(url).hostname or ""
+# Host part of an http(s) URL, skipping optional userinfo; avoids a full urlparse per link
+_HOST_RE = re.compile(r"^https?://(?:[^/?#@]*@)?([^/:?#]+)", re.IGNORECASE)
+
+
+def _same_domain_str(url: str, allowed: Tuple[str, ...]) -> bool:
     if not allowed:
         return True
-    return any(hostname.endswith(dom) for dom in allowed)
+    m = _HOST_RE.match(url)
+    hostname = m.group(1).lower() if m else ""
+    return hostname.endswith(allowed)
+
+
+def _canonical_url(url: str) -> str:
+    # Drop fragments and utm_* tracking params and lowercase scheme/host so variants dedupe
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not k.lower().startswith("utm_")])
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", query, ""))
+
 
+def _extract_text_and_links(html: str) -> Tuple[str, List[str]]:
+    tree = HTMLParser(html)
+    for node in tree.css("script, style, noscript"):
+        node.decompose()
+    text = tree.body.text(separator=" ") if tree.body else ""
+    links = [href for node in tree.css("a[href]") if (href := node.attributes.get("href"))]
+    return text, links
 
-def crawl_and_index(seeds: List[str], allowed_domains: List[str], max_pages: int = 100) -> Tuple[int, List[str]]:
-    allowed_set: Set[str] = set(allowed_domains or [])
-    to_visit: List[str] = list(seeds)
+
+async def crawl_and_index(seeds: List[str], allowed_domains: List[str], max_pages: int = 100) -> Tuple[int, List[str]]:
+    allowed: Tuple[str, ...] = tuple(set(allowed_domains or []))
+    to_visit: "asyncio.Queue[str]" = asyncio.Queue()
+    enqueued: Set[str] = set()
+    for seed in seeds:
+        seed = _canonical_url(seed)
+        if seed not in enqueued:
+            enqueued.add(seed)
+            to_visit.put_nowait(seed)
     seen: Set[str] = set()
-    indexed_pages = 0
     visited: List[str] = []
+    index_tasks: List["asyncio.Task[int]"] = []
+
+    async def index_page(text: str, url: str) -> int:
+        # Chunking + embedding is CPU-bound; keep it off the event loop and out of the fetch path
+        n = await asyncio.to_thread(_chunk_and_index, text, url)
+        visited.append(url)
+        return n
 
-    while to_visit and len(seen) < max_pages:
-        url = to_visit.pop(0)
-        if url in seen:
-            continue
-        seen.add(url)
-        if not _same_domain_str(url, allowed_set):
-            continue
-        try:
-            resp = requests.get(url, timeout=10)
-            if resp.status_code != 200 or "text/html" not in resp.headers.get("Content-Type", ""):
+    async def worker(client: httpx.AsyncClient) -> None:
+        while True:
+            url = await to_visit.get()
+            try:
+                if url in seen or len(seen) >= max_pages:
+                    continue
+                seen.add(url)
+                if not _same_domain_str(url, allowed):
+                    continue
+                resp = await client.get(url)
+                if resp.status_code != 200 or "text/html" not in resp.headers.get("Content-Type", ""):
+                    continue
+                text, links = await asyncio.to_thread(_extract_text_and_links, resp.text)
+                if text.strip():
+                    index_tasks.append(asyncio.create_task(index_page(text, url)))
+                # enqueue links
+                for href in links:
+                    next_url = _canonical_url(urljoin(url, href))
+                    if next_url not in enqueued and _same_domain_str(next_url, allowed):
+                        enqueued.add(next_url)
+                        to_visit.put_nowait(next_url)
+            except Exception:
                 continue
-            soup = BeautifulSoup(resp.text, "html.parser")
-            # Extract text
-            for s in soup(["script", "style", "noscript"]):
-                s.extract()
-            text = soup.get_text(" ")
-            if text.strip():
-                n = _chunk_and_index(text, source_uri=url)
-                indexed_pages += 1 if n > 0 else 0
-                visited.append(url)
-            # enqueue links
-            for a in soup.find_all("a", href=True):
-                href = a.get("href")
-                next_url = urljoin(url, href)
-                if next_url not in seen and _same_domain_str(next_url, allowed_set):
-                    to_visit.append(next_url)
-        except Exception:
-            continue
-
-    return indexed_pages, visited
\ No newline at end of file
+            finally:
+                to_visit.task_done()
+
+    concurrency = max(1, _settings.crawl_concurrency)
+    limits = httpx.Limits(max_connections=concurrency * 2)
+    async with httpx.AsyncClient(timeout=10, http2=True, limits=limits, follow_redirects=True) as client:
+        workers = [asyncio.create_task(worker(client)) for _ in range(concurrency)]
+        await to_visit.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    results = await asyncio.gather(*index_tasks, return_exceptions=True)
+    indexed_pages = sum(1 for n in results if isinstance(n, int) and n > 0)
+    return indexed_pages, visited
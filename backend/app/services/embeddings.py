@@ -1,31 +1,155 @@
 from __future__ import annotations
-from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple
+import os
+import queue
+import threading
+import time
+import numpy as np
 from backend.app.core.config import get_settings
+from backend.app.services.openai_client import get_openai_client
 
 
 _settings = get_settings()
+_USE_OPENAI = _settings.embedding_provider == "openai" and bool(_settings.openai_api_key)
+_BACKEND = _settings.embedding_backend.lower()
+_MODEL_NAME = _settings.sentence_transformer_model
+_BATCH_SIZE = _settings.embedding_batch_size
+_BATCH_WAIT_MS = _settings.embedding_batch_wait_ms
+# Inputs per OpenAI embeddings request (endpoint max is 2048); smaller batches parallelize better
+_OPENAI_BATCH_SIZE = 256
+_OPENAI_CONCURRENCY = max(1, _settings.openai_embedding_concurrency)
 
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    if _settings.embedding_provider == "openai" and _settings.openai_api_key:
+def embed_texts(texts: List[str]) -> np.ndarray:
+    if _USE_OPENAI:
         return _embed_openai(texts)
     return _embed_local(texts)
 
 
-def _embed_local(texts: List[str]) -> List[List[float]]:
-    # Lazy import to avoid heavy load on boot
+@lru_cache(maxsize=2)
+def _get_st_model(model_name: str):
+    # Lazy import to avoid heavy load on boot; the model is loaded once and reused
+    import torch
     from sentence_transformers import SentenceTransformer
 
-    model_name = _settings.sentence_transformer_model
-    model = SentenceTransformer(model_name)
-    embeddings = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-    return embeddings.tolist()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return SentenceTransformer(model_name, device=device)
 
 
-def _embed_openai(texts: List[str]) -> List[List[float]]:
-    from openai import OpenAI
+@lru_cache(maxsize=2)
+def _get_fastembed_model(model_name: str):
+    # ONNX Runtime backend: fused graph kernels, typically faster than PyTorch on CPU
+    from fastembed import TextEmbedding
 
-    client = OpenAI(api_key=_settings.openai_api_key)
+    return TextEmbedding(model_name=model_name, threads=os.cpu_count())
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    if _BACKEND == "fastembed":
+        model = _get_fastembed_model(_MODEL_NAME)
+        embeddings = np.asarray(list(model.embed(texts, batch_size=_BATCH_SIZE)), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.clip(norms, 1e-12, None)
+    if _BACKEND != "st":
+        raise ValueError(f"Unsupported embedding backend: {_BACKEND}")
+    model = _get_st_model(_MODEL_NAME)
+    return model.encode(
+        texts,
+        batch_size=_BATCH_SIZE,
+        convert_to_numpy=True,
+        normalize_embeddings=True,
+    )
+
+
+class _EncodeBatcher:
+    """Coalesces concurrent small encode requests into one forward pass.
+
+    Callers block on a future while a single worker thread drains the queue until it
+    holds `max_batch_size` texts or `max_wait_ms` elapses, then encodes once and
+    hands each caller its slice of the result.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float) -> None:
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, texts: List[str]) -> np.ndarray:
+        self._ensure_worker()
+        fut: Future = Future()
+        self._queue.put((texts, fut))
+        return fut.result()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            n = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while n < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                n += len(item[0])
+            all_texts = [t for texts, _ in batch for t in texts]
+            try:
+                embeddings = _encode(all_texts)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            offset = 0
+            for texts, fut in batch:
+                fut.set_result(embeddings[offset:offset + len(texts)])
+                offset += len(texts)
+
+
+_batcher = _EncodeBatcher(_BATCH_SIZE, _BATCH_WAIT_MS)
+
+
+def _embed_local(texts: List[str]) -> np.ndarray:
+    # Large requests (ingest) already fill a batch; only small ones (queries) are coalesced
+    if len(texts) >= _BATCH_SIZE or _BATCH_WAIT_MS <= 0:
+        embeddings = _encode(texts)
+    else:
+        embeddings = _batcher.submit(texts)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def _embed_openai(texts: List[str]) -> np.ndarray:
+    client = get_openai_client()
     model = _settings.openai_embedding_model
-    response = client.embeddings.create(model=model, input=texts)
-    return [item.embedding for item in response.data]
\ No newline at end of file
+
+    def embed_batch(batch: List[str]) -> np.ndarray:
+        response = client.embeddings.create(model=model, input=batch)
+        return np.asarray([item.embedding for item in response.data], dtype=np.float32)
+
+    starts = range(0, len(texts), _OPENAI_BATCH_SIZE)
+    if len(starts) <= 1:
+        return embed_batch(texts) if texts else np.empty((0, 0), dtype=np.float32)
+
+    # Batches are network-bound; keep several requests in flight on the shared pooled client
+    out: Optional[np.ndarray] = None
+    with ThreadPoolExecutor(max_workers=min(_OPENAI_CONCURRENCY, len(starts))) as pool:
+        batches = pool.map(embed_batch, (texts[s:s + _OPENAI_BATCH_SIZE] for s in starts))
+        for start, vectors in zip(starts, batches):
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[start:start + len(vectors)] = vectors
+    return out
@@ -1,54 +1,151 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple, Union
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
 import os
 import io
+import threading
 import pandas as pd
+import xxhash
+from pybloom_live import ScalableBloomFilter
 from pypdf import PdfReader
-from backend.app.utils.chunking import split_text_by_tokens
+from backend.app.utils.chunking import iter_chunks_by_chars, iter_chunks_by_tokens
 from backend.app.services.embeddings import embed_texts
 from backend.app.services.vectorstore import get_vector_store
+from backend.app.services.agent import invalidate_answer_cache
 from backend.app.core.config import get_settings
 
 _settings = get_settings()
+_CHUNK_SIZE_TOKENS = _settings.chunk_size_tokens
+_CHUNK_OVERLAP_TOKENS = _settings.chunk_overlap_tokens
+_CHUNKER = iter_chunks_by_chars if _settings.chunk_strategy.lower() == "chars" else iter_chunks_by_tokens
 
+# Chunks are embedded and written in groups so the next group's embedding overlaps the current write
+_INDEX_BATCH_SIZE = 64
+# Readers stream documents in pieces so chunking never holds the whole text
+_READ_BLOCK_CHARS = 1 << 20
+_CSV_CHUNK_ROWS = 10_000
 
-def _read_txt(path: str) -> str:
+# Chunk IDs in the store, seeded from the store itself by seed_seen_chunks() and extended
+# with every ID this process writes. Only once seeding has completed does a miss mean the
+# chunk is not stored, letting the store lookup be skipped; before that (or if seeding
+# failed) every ID is looked up. A hit may be a false positive and is always confirmed.
+# Chunks another worker process writes after this one seeded are not in its filter: they
+# get embedded again and upserted under the same content-hash ID, which is idempotent.
+_seen_chunks = ScalableBloomFilter(initial_capacity=100_000, error_rate=0.01)
+_seen_complete = False
+_seen_lock = threading.Lock()
+_SEED_BATCH_IDS = 10_000
+
+
+def seed_seen_chunks() -> None:
+    """Rebuild the seen-chunk filter from every ID currently in the vector store."""
+    global _seen_complete
+    # Added into the live filter, so IDs marked by ingests running meanwhile are kept
+    for cids in _batched(get_vector_store().iter_ids(_SEED_BATCH_IDS), _SEED_BATCH_IDS):
+        _mark_seen(cids)
+    with _seen_lock:
+        _seen_complete = True
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    it = iter(items)
+    while True:
+        part = list(islice(it, size))
+        if not part:
+            return
+        yield part
+
+
+def _mark_seen(ids: Iterable[str]) -> None:
+    with _seen_lock:
+        for cid in ids:
+            _seen_chunks.add(cid)
+
+
+def _read_txt(path: str) -> Iterator[str]:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        return f.read()
+        yield from iter(lambda: f.read(_READ_BLOCK_CHARS), "")
 
 
-def _read_pdf(path: str) -> str:
+def _read_pdf(path: str) -> Iterator[str]:
     reader = PdfReader(path)
-    texts = []
+    first = True
     for page in reader.pages:
         try:
-            texts.append(page.extract_text() or "")
+            text = page.extract_text() or ""
         except Exception:
             continue
-    return "\n".join(texts)
+        yield text if first else "\n" + text
+        first = False
 
 
-def _read_csv_or_xlsx(path: str) -> str:
+def _read_csv_or_xlsx(path: str) -> Iterator[str]:
     if path.lower().endswith(".csv"):
-        df = pd.read_csv(path)
+        for i, df in enumerate(pd.read_csv(path, chunksize=_CSV_CHUNK_ROWS)):
+            yield df.to_csv(index=False, header=(i == 0))
     else:
-        df = pd.read_excel(path)
-    return df.to_csv(index=False)
+        yield pd.read_excel(path).to_csv(index=False)
 
 
-def _chunk_and_index(text: str, source_uri: str) -> int:
-    chunks = split_text_by_tokens(text, _settings.chunk_size_tokens, _settings.chunk_overlap_tokens)
-    if not chunks:
-        return 0
-    vs = get_vector_store()
+def _chunk_id(chunk: str) -> str:
+    # Content-hash IDs make re-ingesting the same text idempotent
+    return xxhash.xxh128_hexdigest(chunk.encode("utf-8"))
+
+
+def _prepare_batch(
+    pool: ThreadPoolExecutor, vs: Any, batch: List[str], offset: int, source_uri: str
+) -> Tuple[List[str], List[str], List[Dict[str, Any]], Optional["Future[Any]"]]:
     ids: List[str] = []
+    texts: List[str] = []
     metadatas: List[Dict[str, Any]] = []
-    for idx, chunk in enumerate(chunks):
-        ids.append(f"{source_uri}#chunk-{idx}")
+    batch_ids: Set[str] = set()
+    for idx, chunk in enumerate(batch, start=offset):
+        cid = _chunk_id(chunk)
+        if cid in batch_ids:
+            continue
+        batch_ids.add(cid)
+        ids.append(cid)
+        texts.append(chunk)
         metadatas.append({"source": source_uri, "chunk_index": idx})
-    embeddings = embed_texts(chunks)
-    vs.add(ids=ids, texts=chunks, metadatas=metadatas, embeddings=embeddings)
-    return len(chunks)
+    # Skip embedding entirely for chunks that are already stored
+    with _seen_lock:
+        maybe_stored = [cid for cid in ids if cid in _seen_chunks] if _seen_complete else ids
+    existing = vs.existing_ids(maybe_stored)
+    if existing:
+        keep = [i for i, cid in enumerate(ids) if cid not in existing]
+        ids = [ids[i] for i in keep]
+        texts = [texts[i] for i in keep]
+        metadatas = [metadatas[i] for i in keep]
+    future = pool.submit(embed_texts, texts) if texts else None
+    return ids, texts, metadatas, future
+
+
+def _chunk_and_index(text: Union[str, Iterable[str]], source_uri: str) -> int:
+    segments = [text] if isinstance(text, str) else text
+    chunks = _CHUNKER(segments, _CHUNK_SIZE_TOKENS, _CHUNK_OVERLAP_TOKENS)
+    batch = list(islice(chunks, _INDEX_BATCH_SIZE))
+    if not batch:
+        return 0
+    vs = get_vector_store()
+    total = 0
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = _prepare_batch(pool, vs, batch, total, source_uri)
+        while batch:
+            total += len(batch)
+            # Chunking the next group overlaps with embedding the current one
+            next_batch = list(islice(chunks, _INDEX_BATCH_SIZE))
+            ids, texts, metadatas, future = pending
+            embeddings = future.result() if future is not None else None
+            if next_batch:
+                pending = _prepare_batch(pool, vs, next_batch, total, source_uri)
+            if ids:
+                vs.add(ids=ids, texts=texts, metadatas=metadatas, embeddings=embeddings)
+                _mark_seen(ids)
+                # Cached answers were retrieved without these chunks
+                invalidate_answer_cache()
+            batch = next_batch
+    return total
 
 
 def ingest_paths(paths: List[str]) -> Tuple[int, List[str]]:
@@ -2,22 +2,21 @@ from __future__ import annotations
 from typing import List, Dict, Any
 from tenacity import retry, stop_after_attempt, wait_exponential
 from backend.app.core.config import get_settings
+from backend.app.services.openai_client import get_openai_client
 
 _settings = get_settings()
+_PROVIDER = _settings.llm_provider
 
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8))
 def generate_response(prompt: str, system: str | None = None) -> str:
-    provider = _settings.llm_provider
-    if provider == "ollama":
+    if _PROVIDER == "ollama":
         return _generate_ollama(prompt, system)
     return _generate_openai(prompt, system)
 
 
 def _generate_openai(prompt: str, system: str | None) -> str:
-    from openai import OpenAI
-
-    client = OpenAI(api_key=_settings.openai_api_key)
+    client = get_openai_client()
     model = _settings.openai_model
     messages: List[Dict[str, Any]] = []
     if system:
@@ -0,0 +1,15 @@
+from __future__ import annotations
+from functools import lru_cache
+import httpx
+from backend.app.core.config import get_settings
+
+_settings = get_settings()
+
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    # One process-wide client so TLS sessions and HTTP/2 connections are reused across calls
+    from openai import OpenAI
+
+    http_client = httpx.Client(http2=True, limits=httpx.Limits(max_keepalive_connections=32))
+    return OpenAI(api_key=_settings.openai_api_key, http_client=http_client)
@@ -1,7 +1,8 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Set, Union
+import threading
+import numpy as np
 import chromadb
-from chromadb.config import Settings as ChromaSettings
 from backend.app.core.config import get_settings
 
 _settings = get_settings()
@@ -9,32 +10,56 @@ _settings = get_settings()
 
 class VectorStore:
     def __init__(self) -> None:
-        self.client = chromadb.Client(ChromaSettings(persist_directory=_settings.chroma_persist_path))
-        self.collection = self.client.get_or_create_collection(name=_settings.chroma_collection, metadata={"hnsw:space": "cosine"})
+        # PersistentClient keeps the HNSW index on disk, so restarts don't require re-ingest
+        self.client = chromadb.PersistentClient(path=_settings.chroma_persist_path)
+        self.collection = self.client.get_or_create_collection(
+            name=_settings.chroma_collection,
+            metadata={
+                "hnsw:space": "cosine",
+                "hnsw:construction_ef": _settings.chroma_hnsw_construction_ef,
+                "hnsw:M": _settings.chroma_hnsw_m,
+            },
+        )
 
     def add(
         self,
         ids: List[str],
         texts: List[str],
         metadatas: Optional[List[Dict[str, Any]]] = None,
-        embeddings: Optional[List[List[float]]] = None,
+        embeddings: Optional[Union[np.ndarray, List[List[float]]]] = None,
     ) -> None:
-        self.collection.add(
+        # Upsert so re-adding an existing ID overwrites instead of erroring/duplicating
+        self.collection.upsert(
             ids=ids,
             documents=texts,
             metadatas=metadatas or [],
             embeddings=embeddings,
         )
 
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        return set(self.collection.get(ids=ids, include=[])["ids"])
+
+    def iter_ids(self, batch_size: int = 10_000) -> Iterator[str]:
+        offset = 0
+        while True:
+            ids = self.collection.get(include=[], limit=batch_size, offset=offset)["ids"]
+            yield from ids
+            if len(ids) < batch_size:
+                return
+            offset += len(ids)
+
     def query(
         self,
         query_texts: Optional[List[str]] = None,
         n_results: int = 8,
-        query_embeddings: Optional[List[List[float]]] = None,
+        query_embeddings: Optional[Union[np.ndarray, List[List[float]]]] = None,
     ) -> Dict[str, Any]:
         kwargs: Dict[str, Any] = {
             "n_results": n_results,
-            "include": ["documents", "metadatas", "distances", "ids"],
+            # IDs are always returned; Chroma rejects "ids" in include
+            "include": ["documents", "metadatas", "distances"],
         }
         if query_embeddings is not None:
             kwargs["query_embeddings"] = query_embeddings
@@ -47,15 +72,19 @@ class VectorStore:
 
 
 _vector_store: Optional[object] = None
+_vector_store_lock = threading.Lock()
 
 
 def get_vector_store() -> object:
+    # Process-wide singleton; the lock keeps concurrent worker threads from building two clients
     global _vector_store
     if _vector_store is None:
-        if _settings.vector_store_provider.lower() == "pgvector":
-            from backend.app.services.vectorstore_pg import PgVectorStore
+        with _vector_store_lock:
+            if _vector_store is None:
+                if _settings.vector_store_provider.lower() == "pgvector":
+                    from backend.app.services.vectorstore_pg import PgVectorStore
 
-            _vector_store = PgVectorStore()
-        else:
-            _vector_store = VectorStore()
+                    _vector_store = PgVectorStore()
+                else:
+                    _vector_store = VectorStore()
     return _vector_store
\ No newline at end of file
@@ -1,17 +1,30 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional, Set, Tuple, Union
+import logging
+import math
 import os
 
-from sqlalchemy import create_engine, text, Table, Column, Text as SAText, MetaData
+import numpy as np
+import xxhash
+from sqlalchemy import create_engine, text, bindparam, Table, Column, Integer, Text as SAText, MetaData
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.engine import Engine, Result
-from sqlalchemy.dialects.postgresql import insert as pg_insert
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC, Vector
+from psycopg2.extras import Json, execute_values
 
 from backend.app.core.config import get_settings
+from backend.app.services.cache import LRUEmbeddingCache
 
 
 _settings = get_settings()
+logger = logging.getLogger(__name__)
+# Rows per multi-VALUES INSERT page in add()
+_INSERT_PAGE_SIZE = 500
+# Refresh planner statistics once this many rows have been written since the last ANALYZE
+_ANALYZE_EVERY_ROWS = 10_000
+# Rows hashed per round when backfilling content_hash for rows written before it existed
+_BACKFILL_BATCH_ROWS = 1000
 
 
 def _build_database_url() -> str:
@@ -42,11 +55,63 @@ def _build_database_url() -> str:
     return url
 
 
+def configure_hnsw_params(count: int) -> Tuple[int, int]:
+    # (m, ef_construction) tiers by table size: larger graphs need more links for recall
+    if count < 100_000:
+        return 16, 64
+    if count < 1_000_000:
+        return 24, 100
+    return 32, 128
+
+
+def configure_ivfflat_lists(count: int) -> int:
+    # pgvector guidance: rows/1000 up to 1M rows, sqrt(rows) beyond
+    if count <= 1_000_000:
+        return max(100, count // 1000)
+    return int(math.sqrt(count))
+
+
+def _vector_literal(vec: Union[np.ndarray, List[float]]) -> str:
+    # A Python list's repr is already pgvector's text input format '[x1, x2, ...]';
+    # Postgres casts it to vector/halfvec. tolist() + repr both run in C.
+    return str(np.asarray(vec, dtype=np.float32).tolist())
+
+
+def _vector_literals(matrix: np.ndarray) -> List[str]:
+    # One tolist() for the whole batch instead of a conversion per row
+    return [str(row) for row in np.asarray(matrix, dtype=np.float32).tolist()]
+
+
+@lru_cache(maxsize=1024)
+def _embed_query(query: str) -> np.ndarray:
+    # Exact-repeat query texts skip the embedding model entirely
+    # Lazy import to avoid circular dependency at module import time
+    from backend.app.services.embeddings import embed_texts
+
+    return embed_texts([query])[0]
+
+
 class PgVectorStore:
     def __init__(self) -> None:
         self.embedding_dim: int = _settings.embedding_dim
         self.distance: str = _settings.pgvector_distance.lower()
+        # Cosine is served as inner product over unit vectors: vectors are normalized once
+        # on write, so pgvector skips the per-row norm computation at query time
+        self.normalize: bool = self.distance == "cosine"
+        self.index_distance: str = "ip" if self.normalize else self.distance
+        self.vector_type: str = "halfvec" if _settings.pgvector_halfvec else "vector"
+        self.index_type: str = _settings.pgvector_index_type.lower()
         self.ivfflat_lists: int = _settings.pgvector_ivfflat_lists
+        self.ivfflat_probes: int = _settings.pgvector_ivfflat_probes
+        self.hnsw_ef_search: int = _settings.hnsw_ef_search
+        self._rows_since_analyze = 0
+        self._hydrate_sql = text("SELECT id, content, metadata FROM documents WHERE id = ANY(:ids)")
+        # Retrieval results keyed by query embedding; invalidated whenever rows are added
+        self._query_cache = LRUEmbeddingCache(
+            capacity=_settings.query_cache_size,
+            threshold=_settings.query_cache_threshold,
+            ttl_seconds=_settings.query_cache_ttl_seconds,
+        )
 
         self.engine: Engine = create_engine(
             _build_database_url(), pool_pre_ping=True, future=True
@@ -58,35 +123,189 @@ class PgVectorStore:
             Column("id", SAText, primary_key=True),
             Column("content", SAText, nullable=False),
             Column("metadata", JSONB, nullable=True),
-            Column("embedding", Vector(dim=self.embedding_dim), nullable=False),
+            Column("content_hash", SAText, nullable=True),
+            Column(
+                "embedding",
+                HALFVEC(dim=self.embedding_dim) if self.vector_type == "halfvec" else Vector(dim=self.embedding_dim),
+                nullable=False,
+            ),
         )
         self._init_schema()
+        # Query statements are built once with typed binds; per call only parameters change.
+        # Postgres converts the qvec text literal to the column type (vector or halfvec) once.
+        self._match_sql = text(
+            f"SELECT id, distance FROM match_document_ids(CAST(:qvec AS {self.vector_type}), :limit)"
+        ).bindparams(bindparam("qvec", type_=SAText), bindparam("limit", type_=Integer))
+
+    def _column_vector_type(self, conn) -> str:
+        # The stored column type wins over PGVECTOR_HALFVEC: create_all never alters an
+        # existing table, and halfvec opclasses/casts fail against a vector column
+        column_type = conn.execute(
+            text(
+                "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                "WHERE attrelid = 'documents'::regclass AND attname = 'embedding' AND NOT attisdropped"
+            )
+        ).scalar_one()
+        base = column_type.split("(", 1)[0]
+        if base not in ("vector", "halfvec"):
+            raise RuntimeError(f"documents.embedding has unsupported type {column_type}; expected vector or halfvec")
+        if base != self.vector_type:
+            logger.warning(
+                "documents.embedding is %s but PGVECTOR_HALFVEC asks for %s; using %s. To switch, "
+                "migrate the column (ALTER TABLE documents ALTER COLUMN embedding TYPE %s(%d) "
+                "USING embedding::%s(%d)) and drop the ANN index so it is rebuilt.",
+                column_type, self.vector_type, base,
+                self.vector_type, self.embedding_dim, self.vector_type, self.embedding_dim,
+            )
+        return base
 
     def _init_schema(self) -> None:
-        opclass = {
-            "cosine": "vector_cosine_ops",
-            "l2": "vector_l2_ops",
-            "ip": "vector_ip_ops",
-        }.get(self.distance, "vector_cosine_ops")
         with self.engine.begin() as conn:
             # Enable extension and create table
             conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS vector")
             self._metadata.create_all(conn)
-            # Create IVFFLAT index for approximate nearest neighbors
+            self.vector_type = self._column_vector_type(conn)
+            # Tables created before content hashing existed get the column added in place
+            conn.exec_driver_sql("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash text")
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents (content_hash)"
+            )
+            self._backfill_content_hashes(conn)
+            self._create_index(conn)
+            self._create_match_function(conn)
+
+    def _backfill_content_hashes(self, conn) -> None:
+        # Rows written before content hashing have NULL content_hash and would never match the
+        # dedup lookup in add(); hash them once here (xxh128 has no SQL equivalent)
+        while True:
+            rows = conn.execute(
+                text("SELECT id, content FROM documents WHERE content_hash IS NULL LIMIT :n"),
+                {"n": _BACKFILL_BATCH_ROWS},
+            ).fetchall()
+            if not rows:
+                return
+            cursor = conn.connection.cursor()
+            try:
+                execute_values(
+                    cursor,
+                    "UPDATE documents AS d SET content_hash = v.h FROM (VALUES %s) AS v(id, h) WHERE d.id = v.id",
+                    [(r[0], xxhash.xxh128_hexdigest(r[1].encode("utf-8"))) for r in rows],
+                    page_size=_INSERT_PAGE_SIZE,
+                )
+            finally:
+                cursor.close()
+
+    def _create_match_function(self, conn) -> None:
+        # Server-side ANN query: an inlinable SQL function, so callers ship only the
+        # vector and k instead of the full statement on every request. It returns only
+        # (id, distance) so the ANN walk never detoasts content/metadata of candidates.
+        op = self._distance_op()
+        # <#> is the negated inner product; 1 + it is the cosine distance for unit vectors
+        distance = f"1 + (d.embedding {op} qvec)" if self.normalize else f"d.embedding {op} qvec"
+        conn.exec_driver_sql(
+            f"""
+            CREATE OR REPLACE FUNCTION match_document_ids(qvec {self.vector_type}, k int)
+            RETURNS TABLE (id text, distance float8)
+            LANGUAGE sql STABLE
+            AS $$
+                SELECT d.id, {distance}
+                FROM documents d
+                ORDER BY d.embedding {op} qvec
+                LIMIT k
+            $$;
+            """
+        )
+
+    def _index_opclass(self) -> str:
+        return {
+            "cosine": f"{self.vector_type}_cosine_ops",
+            "l2": f"{self.vector_type}_l2_ops",
+            "ip": f"{self.vector_type}_ip_ops",
+        }.get(self.index_distance, f"{self.vector_type}_cosine_ops")
+
+    def _index_name(self) -> str:
+        # Named after access method and opclass, so a change of either (e.g. cosine ->
+        # inner-product ops) builds a new index instead of IF NOT EXISTS keeping the old one
+        method = "ivfflat" if self.index_type == "ivfflat" else "hnsw"
+        return f"idx_documents_embedding_{method}_{self._index_opclass()}"
+
+    def _drop_stale_indexes(self, conn) -> None:
+        # Earlier ANN indexes (including the pre-opclass names idx_documents_embedding and
+        # idx_documents_embedding_hnsw) no longer serve queries but still slow every write
+        stale = conn.execute(
+            text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'documents' "
+                "AND indexname LIKE 'idx\\_documents\\_embedding%' AND indexname <> :name"
+            ),
+            {"name": self._index_name()},
+        ).scalars().all()
+        for name in stale:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+
+    def _create_index(self, conn) -> None:
+        opclass = self._index_opclass()
+        name = self._index_name()
+        count = int(conn.execute(text("SELECT COUNT(*) FROM documents")).scalar_one())
+        # Index builds are the dominant one-time cost on large tables; let pgvector
+        # spread them across parallel maintenance workers
+        workers = max(0, int(_settings.pgvector_maintenance_workers))
+        conn.exec_driver_sql(f"SET LOCAL max_parallel_maintenance_workers = {workers}")
+        conn.exec_driver_sql(f"SET LOCAL max_parallel_workers = {workers + 1}")
+        if _settings.pgvector_maintenance_work_mem:
+            # Transaction-local like SET LOCAL; small database tiers may not have RAM to spare
+            conn.execute(
+                text("SELECT set_config('maintenance_work_mem', :mem, true)"),
+                {"mem": _settings.pgvector_maintenance_work_mem},
+            )
+        if self.index_type == "ivfflat":
+            # An existing index keeps the lists it was built with; rebuild_index() re-derives it
+            reloptions = conn.execute(
+                text("SELECT reloptions FROM pg_class WHERE relname = :name"), {"name": name}
+            ).scalar()
+            built = [int(o.split("=", 1)[1]) for o in (reloptions or []) if o.startswith("lists=")]
+            lists = built[0] if built else (_settings.pgvector_ivfflat_lists or configure_ivfflat_lists(count))
+            self.ivfflat_lists = lists
+            self.ivfflat_probes = _settings.pgvector_ivfflat_probes or max(1, int(math.sqrt(lists)))
+            # IVFFLAT index for approximate nearest neighbors
             conn.exec_driver_sql(
                 f"""
-                CREATE INDEX IF NOT EXISTS idx_documents_embedding
+                CREATE INDEX IF NOT EXISTS {name}
                 ON documents USING ivfflat (embedding {opclass})
-                WITH (lists = {int(self.ivfflat_lists)});
+                WITH (lists = {int(lists)});
+                """
+            )
+        else:
+            m, ef_construction = configure_hnsw_params(count)
+            m = _settings.hnsw_m or m
+            ef_construction = _settings.hnsw_ef_construction or ef_construction
+            conn.exec_driver_sql(
+                f"""
+                CREATE INDEX IF NOT EXISTS {name}
+                ON documents USING hnsw (embedding {opclass})
+                WITH (m = {int(m)}, ef_construction = {int(ef_construction)});
                 """
             )
+        self._drop_stale_indexes(conn)
+
+    def rebuild_index(self) -> None:
+        """Drop and re-create the ANN index so its parameters match the current row count."""
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {self._index_name()}")
+            self._create_index(conn)
+
+    def _pre_query(self, conn) -> None:
+        # Search-time recall/speed knob; SET LOCAL scopes it to the current transaction
+        if self.index_type == "ivfflat":
+            conn.exec_driver_sql(f"SET LOCAL ivfflat.probes = {int(self.ivfflat_probes)}")
+        else:
+            conn.exec_driver_sql(f"SET LOCAL hnsw.ef_search = {int(self.hnsw_ef_search)}")
 
     def add(
         self,
         ids: List[str],
         texts: List[str],
         metadatas: Optional[List[Dict[str, Any]]] = None,
-        embeddings: Optional[List[List[float]]] = None,
+        embeddings: Optional[Union[np.ndarray, List[List[float]]]] = None,
     ) -> None:
         if not ids:
             return
@@ -94,83 +313,141 @@ class PgVectorStore:
             raise ValueError("embeddings must be provided when using PgVectorStore")
         if len(ids) != len(texts) or len(ids) != len(embeddings):
             raise ValueError("ids, texts, embeddings must be the same length")
-        rows = []
-        for i, _id in enumerate(ids):
-            row = {
-                "id": _id,
-                "content": texts[i],
-                "metadata": (metadatas[i] if metadatas and i < len(metadatas) else None),
-                "embedding": embeddings[i],
-            }
-            rows.append(row)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        # Content already stored under a different id is skipped, along with duplicates in
+        # this call. A row whose id already holds this content is kept: the upsert below
+        # writes it only if its metadata changed, so metadata-only updates still land.
+        # (Hashing happens here, after embedding; it saves the write, not the embedding.)
+        hashes = [xxhash.xxh128_hexdigest(t.encode("utf-8")) for t in texts]
         with self.engine.begin() as conn:
-            stmt = pg_insert(self._documents).values(rows)
-            stmt = stmt.on_conflict_do_update(
-                index_elements=[self._documents.c.id],
-                set_={
-                    "content": stmt.excluded.content,
-                    "metadata": stmt.excluded.metadata,
-                    "embedding": stmt.excluded.embedding,
-                },
+            res: Result = conn.execute(
+                text("SELECT content_hash, id FROM documents WHERE content_hash = ANY(:hs)"), {"hs": hashes}
             )
-            conn.execute(stmt)
-
-    def _distance_sql(self) -> Tuple[str, str]:
-        # Returns (order_by_expr, select_distance_expr)
-        if self.distance == "l2":
-            op = "<->"
-        elif self.distance == "ip":
-            op = "<#>"
-        else:
-            op = "<=>"  # cosine distance
-        return (f"embedding {op} :qvec", f"embedding {op} :qvec AS distance")
+            stored: Dict[str, Set[str]] = {}
+            for h, _id in res:
+                stored.setdefault(h, set()).add(_id)
+        keep: List[int] = []
+        batch_hashes: Set[str] = set()
+        for i, h in enumerate(hashes):
+            if h in batch_hashes:
+                continue
+            holders = stored.get(h)
+            if holders and ids[i] not in holders:
+                continue
+            batch_hashes.add(h)
+            keep.append(i)
+        if not keep:
+            return
+        embeddings = embeddings[keep]
+        if self.normalize:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        literals = _vector_literals(embeddings)
+        rows = []
+        for j, i in enumerate(keep):
+            metadata = metadatas[i] if metadatas and i < len(metadatas) else None
+            rows.append((ids[i], texts[i], Json(metadata) if metadata is not None else None, hashes[i], literals[j]))
+        with self.engine.begin() as conn:
+            # Raw psycopg2 cursor: execute_values pages rows into bounded multi-VALUES
+            # statements instead of compiling one giant INSERT for the whole batch
+            cursor = conn.connection.cursor()
+            try:
+                execute_values(
+                    cursor,
+                    """
+                    INSERT INTO documents (id, content, metadata, content_hash, embedding) VALUES %s
+                    ON CONFLICT (id) DO UPDATE SET
+                        content = EXCLUDED.content,
+                        metadata = EXCLUDED.metadata,
+                        content_hash = EXCLUDED.content_hash,
+                        embedding = EXCLUDED.embedding
+                    WHERE documents.content IS DISTINCT FROM EXCLUDED.content
+                        OR documents.metadata IS DISTINCT FROM EXCLUDED.metadata
+                        OR documents.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+                        OR documents.embedding IS DISTINCT FROM EXCLUDED.embedding
+                    """,
+                    rows,
+                    template=f"(%s, %s, %s, %s, %s::{self.vector_type})",
+                    page_size=_INSERT_PAGE_SIZE,
+                )
+            finally:
+                cursor.close()
+        self._query_cache.clear()
+        self._rows_since_analyze += len(rows)
+        if self._rows_since_analyze >= _ANALYZE_EVERY_ROWS:
+            self._rows_since_analyze = 0
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("ANALYZE documents")
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        if not ids:
+            return set()
+        with self.engine.begin() as conn:
+            res: Result = conn.execute(text("SELECT id FROM documents WHERE id = ANY(:ids)"), {"ids": list(ids)})
+            return {r[0] for r in res}
+
+    def iter_ids(self, batch_size: int = 10_000) -> Iterator[str]:
+        # Server-side cursor: IDs stream in batches instead of materializing the table
+        with self.engine.connect() as conn:
+            res: Result = conn.execution_options(stream_results=True).execute(text("SELECT id FROM documents"))
+            for part in res.partitions(batch_size):
+                for r in part:
+                    yield r[0]
+
+    def _distance_op(self) -> str:
+        if self.index_distance == "l2":
+            return "<->"
+        if self.index_distance == "ip":
+            return "<#>"
+        return "<=>"  # cosine distance
 
     def query(
         self,
         query_texts: Optional[List[str]] = None,
         n_results: int = 8,
-        query_embeddings: Optional[List[List[float]]] = None,
+        query_embeddings: Optional[Union[np.ndarray, List[List[float]]]] = None,
+        fetch_content: bool = True,
     ) -> Dict[str, Any]:
-        if (not query_embeddings) and query_texts:
-            # Lazy import to avoid circular dependency at module import time
-            from backend.app.services.embeddings import embed_texts
-
-            query_embeddings = embed_texts([query_texts[0]])
+        if query_embeddings is None and query_texts:
+            query_embeddings = [_embed_query(query_texts[0])]
 
-        if not query_embeddings:
+        if query_embeddings is None or len(query_embeddings) == 0:
             raise ValueError("Either query_embeddings or query_texts must be provided")
 
-        qvec = query_embeddings[0]
-        order_by_expr, distance_expr = self._distance_sql()
+        q = np.asarray(query_embeddings[0], dtype=np.float32)
+        qn = q / max(float(np.linalg.norm(q)), 1e-12)
+        cached = self._query_cache.get_similar(int(n_results), qn)
+        if cached is not None:
+            return cached
 
-        typed_sql = text(
-            f"""
-            SELECT id, content, metadata, {distance_expr}
-            FROM documents
-            ORDER BY {order_by_expr}
-            LIMIT :limit
-            """
-        )
+        qvec = _vector_literal(qn if self.normalize else q)
         with self.engine.begin() as conn:
-            res: Result = conn.execute(typed_sql, {"qvec": qvec, "limit": int(n_results)})
+            self._pre_query(conn)
+            res: Result = conn.execute(self._match_sql, {"qvec": qvec, "limit": int(n_results)})
             rows = res.fetchall()
+            # Transpose once; distances come back as Python floats via one C-level tolist()
+            id_col, dist_col = zip(*rows) if rows else ((), ())
+            ids: List[str] = list(id_col)
+            distances: List[float] = np.asarray(dist_col, dtype=np.float64).tolist()
+            if not fetch_content:
+                return {"ids": [ids], "distances": [distances]}
+            # Hydrate only the top-k winners by primary key
+            hydrated: Dict[str, Any] = {}
+            if ids:
+                res = conn.execute(self._hydrate_sql, {"ids": ids})
+                hydrated = {r[0]: r for r in res}
 
-        documents: List[str] = []
-        metadatas: List[Dict[str, Any]] = []
-        ids: List[str] = []
-        distances: List[float] = []
-        for r in rows:
-            ids.append(r[0])
-            documents.append(r[1])
-            metadatas.append(r[2] or {})
-            distances.append(float(r[3]))
+        ordered = [hydrated[_id] for _id in ids]
+        documents: List[str] = [r[1] for r in ordered]
+        metadatas: List[Dict[str, Any]] = [r[2] or {} for r in ordered]
 
-        return {
+        result = {
             "documents": [documents],
             "metadatas": [metadatas],
             "ids": [ids],
             "distances": [distances],
         }
+        self._query_cache.put(qn.tobytes().hex(), int(n_results), qn, result)
+        return result
 
     def count(self) -> int:
         with self.engine.begin() as conn:
@@ -1,28 +1,122 @@
 from __future__ import annotations
-from typing import List
+from functools import lru_cache
+from typing import Iterable, Iterator, List
+import numpy as np
 import tiktoken
 
 
+@lru_cache(maxsize=8)
+def _enc(name: str) -> "tiktoken.Encoding":
+    return tiktoken.get_encoding(name)
+
+
 def _encode_length(text: str, encoding: str) -> int:
-    enc = tiktoken.get_encoding(encoding)
-    return len(enc.encode(text))
+    return len(_enc(encoding).encode(text))
 
 
 def split_text_by_tokens(text: str, chunk_size: int, overlap: int, encoding: str = "cl100k_base") -> List[str]:
-    enc = tiktoken.get_encoding(encoding)
+    if chunk_size <= 0:
+        return [text]
+
+    enc = _enc(encoding)
     tokens = enc.encode(text)
-    chunks: List[str] = []
+    n = len(tokens)
+    step = max(1, chunk_size - overlap)
+
+    # All window bounds at once; keep windows up to the first one that reaches the end
+    starts = np.arange(0, n, step)
+    last = int(np.searchsorted(starts + chunk_size, n))
+    starts = starts[: last + 1]
+    ends = np.minimum(starts + chunk_size, n)
+    slices = [tokens[s:e] for s, e in zip(starts.tolist(), ends.tolist())]
+
+    # One call into tiktoken's batch decoder instead of a decode per chunk
+    return enc.decode_batch(slices)
+
+
+def iter_chunks_by_tokens(
+    segments: Iterable[str], chunk_size: int, overlap: int, encoding: str = "cl100k_base"
+) -> Iterator[str]:
+    """Lazily chunk a stream of text segments (pages, rows, blocks) that concatenate to one document.
 
+    Keeps only a rolling token buffer, so memory is O(chunk_size) rather than O(document).
+    Produces the same windows as split_text_by_tokens, modulo tokenization at segment edges.
+    """
     if chunk_size <= 0:
-        return [text]
+        text = "".join(segments)
+        if text:
+            yield text
+        return
+
+    enc = _enc(encoding)
+    step = max(1, chunk_size - overlap)
+    buffer: List[int] = []
+    has_new_tokens = False
+    for segment in segments:
+        tokens = enc.encode(segment)
+        if not tokens:
+            continue
+        buffer.extend(tokens)
+        has_new_tokens = True
+        windows: List[List[int]] = []
+        while len(buffer) >= chunk_size:
+            windows.append(buffer[:chunk_size])
+            del buffer[:step]
+            has_new_tokens = len(buffer) > chunk_size - step
+        if windows:
+            yield from enc.decode_batch(windows)
+    if buffer and has_new_tokens:
+        yield enc.decode(buffer)
+
+
+def _fits_tokens(chunk: str, chunk_size: int, overlap: int, encoding: str) -> List[str]:
+    # A token covers at least one UTF-8 byte, so short chunks can skip the encode entirely
+    if len(chunk.encode("utf-8")) <= chunk_size or _encode_length(chunk, encoding) <= chunk_size:
+        return [chunk]
+    return split_text_by_tokens(chunk, chunk_size, overlap, encoding)
+
+
+def iter_chunks_by_chars(
+    segments: Iterable[str],
+    chunk_size: int,
+    overlap: int,
+    encoding: str = "cl100k_base",
+    chars_per_token: int = 4,
+) -> Iterator[str]:
+    """Approximate token chunking by character windows of `chunk_size * chars_per_token`.
+
+    Windows end on the nearest whitespace in their second half. Text is never decoded;
+    each chunk is only encoded to verify it fits, and oversized ones are split exactly.
+    """
+    if chunk_size <= 0:
+        yield from iter_chunks_by_tokens(segments, chunk_size, overlap, encoding)
+        return
+
+    window = chunk_size * chars_per_token
+    overlap_chars = max(0, overlap) * chars_per_token
+    buffer = ""
+    pos = 0
+    emitted_to = 0
+    for segment in segments:
+        if not segment:
+            continue
+        # Trim consumed text once per segment rather than once per chunk
+        buffer = buffer[pos:] + segment
+        emitted_to -= pos
+        pos = 0
+        while len(buffer) - pos >= window:
+            end = pos + window
+            cut = max(buffer.rfind(" ", pos + window // 2, end), buffer.rfind("\n", pos + window // 2, end))
+            if cut > pos:
+                end = cut
+            yield from _fits_tokens(buffer[pos:end], chunk_size, overlap, encoding)
+            emitted_to = end
+            pos = max(pos + 1, end - overlap_chars)
+    if len(buffer) > emitted_to and buffer[pos:].strip():
+        yield from _fits_tokens(buffer[pos:], chunk_size, overlap, encoding)
 
-    start = 0
-    while start < len(tokens):
-        end = min(start + chunk_size, len(tokens))
-        chunk_tokens = tokens[start:end]
-        chunks.append(enc.decode(chunk_tokens))
-        if end == len(tokens):
-            break
-        start = max(0, end - overlap)
 
-    return chunks
\ No newline at end of file
+def split_text_by_chars(
+    text: str, chunk_size: int, overlap: int, encoding: str = "cl100k_base", chars_per_token: int = 4
+) -> List[str]:
+    return list(iter_chunks_by_chars([text], chunk_size, overlap, encoding, chars_per_token))
@@ -0,0 +1,12 @@
+from __future__ import annotations
+import numpy as np
+
+
+def quantize_int8(embeddings: np.ndarray) -> np.ndarray:
+    # Valid for L2-normalized embeddings, whose components lie in [-1, 1]
+    return np.clip(np.round(np.asarray(embeddings, dtype=np.float32) * 127), -128, 127).astype(np.int8)
+
+
+def int8_scores(db: np.ndarray, query: np.ndarray) -> np.ndarray:
+    # Dot products accumulated in int32; proportional to cosine similarity (scale 127**2)
+    return np.einsum("nd,d->n", db, query, dtype=np.int32)
@@ -0,0 +1,13 @@
+from __future__ import annotations
+import aiofiles
+from fastapi import UploadFile
+
+_UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+async def save_upload_file(upload: UploadFile, path: str) -> str:
+    # Stream to disk so memory stays bounded regardless of upload size
+    async with aiofiles.open(path, "wb") as out:
+        while chunk := await upload.read(_UPLOAD_CHUNK_SIZE):
+            await out.write(chunk)
+    return path
@@ -34,21 +34,23 @@ def demo():
     agent = create_agent(model_name="gpt2")
     print("✓ Agent initialized\n")
     
-    # Step 3: Load sample data
-    print("Step 3: Loading sample dataset...")
-    processor = DataProcessor()
-    documents = processor.process_file(sample_path)
-    metadata = [{'source': sample_path, 'type': 'sample_data'}] * len(documents)
-    agent.ingest_documents(documents, metadata)
-    print(f"✓ Loaded {len(documents)} documents\n")
-    
-    # Step 4: Load technical documentation
-    print("Step 4: Loading technical documentation...")
-    web_collector = WebDataCollector()
-    tech_docs = web_collector.get_technical_documentation()
-    tech_metadata = [{'source': 'technical_docs', 'type': 'documentation'}] * len(tech_docs)
-    agent.ingest_documents(tech_docs, tech_metadata)
-    print(f"✓ Loaded {len(tech_docs)} technical documents\n")
+    # Steps 3-4 share one ingest session so the vector store is persisted once
+    with agent.ingest_session():
+        # Step 3: Load sample data
+        print("Step 3: Loading sample dataset...")
+        processor = DataProcessor()
+        documents = processor.process_file(sample_path)
+        metadata = {'source': sample_path, 'type': 'sample_data'}
+        count = agent.ingest_documents(documents, metadata)
+        print(f"✓ Loaded {count} documents\n")
+        
+        # Step 4: Load technical documentation
+        print("Step 4: Loading technical documentation...")
+        web_collector = WebDataCollector()
+        tech_docs = web_collector.get_technical_documentation()
+        tech_metadata = [{'source': 'technical_docs', 'type': 'documentation'}] * len(tech_docs)
+        agent.ingest_documents(tech_docs, tech_metadata)
+        print(f"✓ Loaded {len(tech_docs)} technical documents\n")
     
     # Step 5: Show statistics
     print("Step 5: System Statistics")
@@ -63,11 +63,11 @@ class PressureValveApp:
             documents = self.data_processor.process_file(file_path)
             
             # Ingest into the agent
-            metadata = [{'source': file_path, 'type': 'uploaded_dataset'}] * len(documents)
-            self.agent.ingest_documents(documents, metadata)
+            metadata = {'source': file_path, 'type': 'uploaded_dataset'}
+            count = self.agent.ingest_documents(documents, metadata)
             
             logger.info(f"Successfully uploaded and processed dataset: {file_path}")
-            print(f"\n✓ Dataset uploaded: {len(documents)} documents ingested\n")
+            print(f"\n✓ Dataset uploaded: {count} documents ingested\n")
             
         except Exception as e:
             logger.error(f"Error uploading dataset: {e}")
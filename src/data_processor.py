@@ -6,15 +6,29 @@ Handles various data formats and preprocessing for the LLM agent
 
 import os
 import json
-import csv
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from pathlib import Path
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
+import orjson
 import pandas as pd
 
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:  # pragma: no cover - optional fast path
+    pa = pacsv = None
+
 logger = logging.getLogger(__name__)
 
+# JSON files larger than this are streamed item by item instead of loaded whole
+JSON_STREAM_THRESHOLD = 10_000_000
+# Text files larger than this are yielded paragraph by paragraph instead of read whole
+TEXT_STREAM_THRESHOLD = 5_000_000
+
 
 class DataProcessor:
     """
@@ -30,8 +44,11 @@ class DataProcessor:
         """
         self.upload_dir = Path(upload_dir)
         self.upload_dir.mkdir(parents=True, exist_ok=True)
+        # (name, path) of each uploaded file as of the last directory scan
+        self._uploads_cache: List[tuple] = []
+        self._uploads_cache_mtime: Optional[int] = None
     
-    def process_text_file(self, file_path: str) -> List[str]:
+    def process_text_file(self, file_path: str) -> Iterable[str]:
         """
         Process a text file
         
@@ -39,9 +56,12 @@ class DataProcessor:
             file_path: Path to the text file
             
         Returns:
-            List of document strings
+            List of document strings, or a one-shot iterator of paragraphs for very large files
         """
         try:
+            if os.path.getsize(file_path) > TEXT_STREAM_THRESHOLD:
+                return self._iter_paragraphs(file_path)
+            
             with open(file_path, 'r', encoding='utf-8') as f:
                 content = f.read()
             
@@ -56,6 +76,20 @@ class DataProcessor:
             logger.error(f"Error processing text file {file_path}: {e}")
             raise
     
+    @staticmethod
+    def _iter_paragraphs(file_path: str) -> Iterator[str]:
+        """Yield blank-line separated paragraphs, holding only one paragraph in memory"""
+        buf = []
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    buf.append(line)
+                elif buf:
+                    yield ''.join(buf).strip()
+                    buf.clear()
+        if buf:
+            yield ''.join(buf).strip()
+    
     def process_csv_file(self, file_path: str) -> List[str]:
         """
         Process a CSV file containing pressure valve data
@@ -67,15 +101,17 @@ class DataProcessor:
             List of document strings (one per row)
         """
         try:
-            df = pd.read_csv(file_path)
+            df = self._read_csv(file_path)
             
-            documents = []
-            for idx, row in df.iterrows():
-                # Convert row to a readable text format
-                doc_text = f"Record {idx + 1}:\n"
-                for col in df.columns:
-                    doc_text += f"{col}: {row[col]}\n"
-                documents.append(doc_text)
+            # Convert rows to a readable text format with one format template per schema;
+            # missing cells render as "nan" whichever reader produced them
+            fmt = _record_template(tuple(str(col) for col in df.columns)).format
+            # Positional access: a label lookup returns a DataFrame if a name repeats
+            columns = [
+                df.iloc[:, i].to_numpy(dtype=object, na_value=float("nan"))
+                for i in range(df.shape[1])
+            ]
+            documents = list(map(fmt, range(1, len(df) + 1), *columns))
             
             logger.info(f"Processed {len(documents)} records from CSV")
             return documents
@@ -84,6 +120,29 @@ class DataProcessor:
             logger.error(f"Error processing CSV file {file_path}: {e}")
             raise
     
+    @staticmethod
+    def _read_csv(file_path: str) -> pd.DataFrame:
+        """Read a CSV with Arrow's multithreaded parser, falling back to pandas"""
+        if pacsv is None:
+            return pd.read_csv(file_path)
+        try:
+            table = pacsv.read_csv(
+                file_path,
+                read_options=pacsv.ReadOptions(use_threads=True, block_size=1 << 20),
+                # Treat empty/NA strings as missing, like pandas does
+                convert_options=pacsv.ConvertOptions(strings_can_be_null=True),
+            )
+        except pa.ArrowInvalid:
+            return pd.read_csv(file_path)
+        # Arrow types non-UTF-8 text (e.g. Latin-1 exports) as binary; let pandas
+        # decode it or raise rather than embedding bytes reprs
+        if any(pa.types.is_binary(t) or pa.types.is_large_binary(t) for t in table.schema.types):
+            return pd.read_csv(file_path)
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+        # Arrow keeps repeated header names; rename them "a", "a.1", ... as pd.read_csv does
+        df.columns = _dedup_names(list(df.columns))
+        return df
+    
     def process_json_file(self, file_path: str) -> List[str]:
         """
         Process a JSON file containing pressure valve data
@@ -95,19 +154,29 @@ class DataProcessor:
             List of document strings
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            if os.path.getsize(file_path) > JSON_STREAM_THRESHOLD and self._json_root_is_array(file_path):
+                documents = self._stream_json_array(file_path)
+                logger.info(f"Processed {len(documents)} records from JSON (streamed)")
+                return documents
+            
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            try:
+                data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # orjson rejects NaN/Infinity literals and integers wider than 64 bits
+                data = json.loads(raw)
             
             documents = []
             
             # Handle different JSON structures
             if isinstance(data, list):
                 for idx, item in enumerate(data):
-                    doc_text = f"Record {idx + 1}:\n{json.dumps(item, indent=2)}"
+                    doc_text = f"Record {idx + 1}:\n{_dumps(item)}"
                     documents.append(doc_text)
             elif isinstance(data, dict):
                 # If it's a single dictionary, convert to text
-                doc_text = json.dumps(data, indent=2)
+                doc_text = _dumps(data)
                 documents.append(doc_text)
             else:
                 documents.append(str(data))
@@ -119,7 +188,31 @@ class DataProcessor:
             logger.error(f"Error processing JSON file {file_path}: {e}")
             raise
     
-    def process_file(self, file_path: str) -> List[str]:
+    @staticmethod
+    def _json_root_is_array(file_path: str) -> bool:
+        """Check whether the first non-whitespace byte of a JSON file opens an array"""
+        with open(file_path, 'rb') as f:
+            while True:
+                block = f.read(4096)
+                if not block:
+                    return False
+                stripped = block.lstrip(b' \t\r\n\xef\xbb\xbf')
+                if stripped:
+                    return stripped[:1] == b'['
+    
+    @staticmethod
+    def _stream_json_array(file_path: str) -> List[str]:
+        """Parse a top-level JSON array one item at a time so only a single record is decoded at once"""
+        # Imported lazily; only needed for large files
+        import ijson
+        
+        with open(file_path, 'rb') as f:
+            return [
+                f"Record {idx + 1}:\n{_dumps(item)}"
+                for idx, item in enumerate(ijson.items(f, 'item', use_float=True))
+            ]
+    
+    def process_file(self, file_path: str) -> Iterable[str]:
         """
         Process a file based on its extension
         
@@ -127,7 +220,7 @@ class DataProcessor:
             file_path: Path to the file
             
         Returns:
-            List of document strings
+            Document strings (a one-shot iterator for very large text files)
         """
         file_path = Path(file_path)
         extension = file_path.suffix.lower()
@@ -143,6 +236,31 @@ class DataProcessor:
         else:
             raise ValueError(f"Unsupported file type: {extension}")
     
+    def process_files(self, file_paths: List[str], max_workers: Optional[int] = None) -> List[List[str]]:
+        """
+        Process several files in parallel worker threads
+        
+        Args:
+            file_paths: Paths to the files
+            max_workers: Number of worker threads (defaults to the CPU count)
+            
+        Returns:
+            List of document string lists, in the same order as file_paths
+        """
+        if len(file_paths) <= 1:
+            return [self._process_file_list(path) for path in file_paths]
+        
+        workers = min(max_workers or os.cpu_count() or 1, len(file_paths))
+        # Threads, not processes: this runs inside the API process (which holds the loaded
+        # model), where forking is costly and unsafe; Arrow's CSV parser and file I/O
+        # release the GIL anyway
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._process_file_list, file_paths))
+    
+    def _process_file_list(self, file_path: str) -> List[str]:
+        # Materialize streamed text so every result is a plain list
+        return list(self.process_file(file_path))
+    
     def save_upload(self, file_content: bytes, filename: str) -> str:
         """
         Save an uploaded file
@@ -174,21 +292,68 @@ class DataProcessor:
             List of file information dictionaries
         """
         try:
+            # Adding, removing or renaming an entry bumps the directory mtime, so the
+            # name list is only rescanned then. Rewriting a file in place does not, so
+            # sizes are always read fresh.
+            dir_mtime = os.stat(self.upload_dir).st_mtime_ns
+            if self._uploads_cache_mtime != dir_mtime:
+                with os.scandir(self.upload_dir) as it:
+                    self._uploads_cache = [
+                        (entry.name, entry.path)
+                        for entry in it
+                        if entry.is_file() and not entry.name.startswith('.')
+                    ]
+                self._uploads_cache_mtime = dir_mtime
+            
             files = []
-            for file_path in self.upload_dir.iterdir():
-                if file_path.is_file() and not file_path.name.startswith('.'):
-                    files.append({
-                        'name': file_path.name,
-                        'path': str(file_path),
-                        'size': file_path.stat().st_size,
-                        'extension': file_path.suffix
-                    })
+            for name, path in self._uploads_cache:
+                try:
+                    size = os.stat(path).st_size
+                except FileNotFoundError:
+                    continue
+                files.append({
+                    'name': name,
+                    'path': path,
+                    'size': size,
+                    'extension': os.path.splitext(name)[1]
+                })
             return files
         except Exception as e:
             logger.error(f"Error listing uploads: {e}")
             return []
 
 
+def _dedup_names(names: List[str]) -> List[str]:
+    """Suffix repeated column names with .1, .2, ... the same way pandas' CSV reader does"""
+    counts: Dict[str, int] = defaultdict(int)
+    deduped = []
+    for name in names:
+        count = counts[name]
+        while count > 0:
+            counts[name] = count + 1
+            name = f"{name}.{count}"
+            count = counts[name]
+        deduped.append(name)
+        counts[name] = count + 1
+    return deduped
+
+
+@lru_cache(maxsize=64)
+def _record_template(columns: tuple) -> str:
+    """Build the "Record N:" format string for a CSV schema once"""
+    escaped = (col.replace('{', '{{').replace('}', '}}') for col in columns)
+    return "Record {}:\n" + "".join(f"{col}: {{}}\n" for col in escaped)
+
+
+def _dumps(item: Any) -> str:
+    """Serialize a JSON record compactly; indentation only adds tokens to embed"""
+    try:
+        return orjson.dumps(item).decode()
+    except orjson.JSONEncodeError:
+        # Integers wider than 64 bits, which json.loads accepts
+        return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+
 def create_sample_dataset(output_path: str = "./data/sample_pressure_valves.csv"):
     """
     Create a sample dataset for pressure relief valves for testing
@@ -9,32 +9,50 @@ This module implements a specialized LLM agent that can:
 
 import os
 import json
-from typing import List, Dict, Optional, Any
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Iterable, Optional, Any, Union
 from pathlib import Path
 import logging
+import threading
 
 try:
     from langchain_community.embeddings import HuggingFaceEmbeddings
     from langchain_community.vectorstores import Chroma
     from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain.docstore.document import Document
     from langchain.chains import RetrievalQA
     from langchain.llms.base import LLM
+    from langchain_core.embeddings import Embeddings
 except ImportError:
     # Fallback for older langchain versions
     from langchain.embeddings import HuggingFaceEmbeddings
     from langchain.vectorstores import Chroma
     from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain.docstore.document import Document
     from langchain.chains import RetrievalQA
     from langchain.llms.base import LLM
+    from langchain.embeddings.base import Embeddings
 from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import numpy as np
 import torch
+import xxhash
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Chunks per embedding-model forward pass during ingestion
+EMBED_BATCH_SIZE = 64
+# Documents retrieved per query
+RETRIEVAL_K = 3
+# Character-based chunking for ingested documents
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Documents split and embedded per step, so streamed inputs are never fully materialized
+INGEST_BATCH_DOCS = 256
+# Stored chunks read per collection.get() call when seeding the chunk-hash set
+SEED_HASHES_BATCH = 10_000
+
 
 class PressureValveLLM(LLM):
     """
@@ -58,12 +76,27 @@ class PressureValveLLM(LLM):
         """Initialize the language model and tokenizer"""
         try:
             logger.info(f"Loading model: {self.model_name}")
+            use_cuda = torch.cuda.is_available()
+            # Half-precision weights on GPU halve memory traffic per generated token
+            if use_cuda:
+                dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            else:
+                dtype = torch.float32
+            
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
             self.model = AutoModelForCausalLM.from_pretrained(
                 self.model_name,
-                torch_dtype=torch.float32,
+                torch_dtype=dtype,
                 low_cpu_mem_usage=True
             )
+            self.model.eval()
+            if use_cuda:
+                self.model.to("cuda")
+                # Compile the forward pass only; generate() and the pipeline keep the HF model object.
+                # Default mode, not "reduce-overhead": the dynamic KV cache changes shape every
+                # decode step, so CUDA graphs would be re-recorded instead of replayed
+                if hasattr(torch, "compile"):
+                    self.model.forward = torch.compile(self.model.forward, dynamic=True)
             
             # Create text generation pipeline
             self.pipeline = pipeline(
@@ -73,6 +106,7 @@ class PressureValveLLM(LLM):
                 max_length=self.max_length,
                 temperature=self.temperature,
                 do_sample=True,
+                device=0 if use_cuda else -1,
             )
             logger.info("Model loaded successfully")
         except Exception as e:
@@ -82,7 +116,7 @@ class PressureValveLLM(LLM):
     def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
         """Generate text from the model"""
         try:
-            result = self.pipeline(prompt, max_new_tokens=256, num_return_sequences=1)
+            result = self.pipeline(prompt, max_new_tokens=256, num_return_sequences=1, use_cache=True)
             generated_text = result[0]["generated_text"]
             
             # Remove the prompt from the generated text
@@ -108,6 +142,67 @@ class PressureValveLLM(LLM):
         }
 
 
+class ONNXEmbeddings(Embeddings):
+    """
+    Sentence embeddings from a dynamically int8-quantized ONNX export of the model.
+    The quantized model is built once and cached on disk; inference runs on ONNX Runtime's CPU provider.
+    """
+    
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        cache_dir: str = "./models/onnx-int8",
+        batch_size: int = EMBED_BATCH_SIZE
+    ):
+        # Imported lazily; optimum is only needed for this backend
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        
+        self.batch_size = batch_size
+        save_dir = Path(cache_dir) / model_name.replace("/", "__")
+        if not (save_dir / "model_quantized.onnx").exists():
+            logger.info(f"Exporting and quantizing embeddings model to int8: {model_name}")
+            model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+            quantizer = ORTQuantizer.from_pretrained(model)
+            quantizer.quantize(
+                save_dir=save_dir,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            )
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(save_dir)
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(save_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            save_dir,
+            file_name="model_quantized.onnx",
+            provider="CPUExecutionProvider"
+        )
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                return_tensors="np"
+            )
+            hidden = np.asarray(self.model(**inputs).last_hidden_state)
+            # Mean pooling over real tokens, then L2-normalize (sentence-transformers semantics)
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled)
+        if not vectors:
+            return []
+        return np.concatenate(vectors).tolist()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+
 class PressureValveAgent:
     """
     Main agent class for pressure relief valve expertise.
@@ -118,7 +213,8 @@ class PressureValveAgent:
         self,
         model_name: str = "gpt2",
         embeddings_model: str = "sentence-transformers/all-MiniLM-L6-v2",
-        persist_directory: str = "./data/chroma_db"
+        persist_directory: str = "./data/chroma_db",
+        embeddings_backend: str = "hf"
     ):
         """
         Initialize the Pressure Valve Agent
@@ -127,6 +223,7 @@ class PressureValveAgent:
             model_name: Name of the HuggingFace model to use
             embeddings_model: Name of the embeddings model
             persist_directory: Directory to persist vector database
+            embeddings_backend: "hf" (transformers, FP32) or "onnx-int8" (quantized ONNX Runtime)
         """
         self.model_name = model_name
         self.persist_directory = persist_directory
@@ -134,16 +231,41 @@ class PressureValveAgent:
         logger.info("Initializing Pressure Valve Agent...")
         
         # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embeddings_model,
-            model_kwargs={'device': 'cpu'}
+        if embeddings_backend == "onnx-int8":
+            self.embeddings = ONNXEmbeddings(model_name=embeddings_model)
+        else:
+            self.embeddings = HuggingFaceEmbeddings(
+                model_name=embeddings_model,
+                model_kwargs={'device': 'cuda' if torch.cuda.is_available() else 'cpu'},
+                encode_kwargs={'batch_size': EMBED_BATCH_SIZE, 'normalize_embeddings': True}
+            )
+        
+        # Built once and reused by every ingest call
+        self._text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            length_function=len
         )
         
+        # Repeated questions reuse their embedding instead of re-running the model
+        self._embed_query = lru_cache(maxsize=1024)(self._embed_query_uncached)
+        
         # Initialize LLM
         self.llm = PressureValveLLM(model_name=model_name)
         
         # Initialize or load vector store
         self.vectorstore = self._initialize_vectorstore()
+        # Open ingest_session() scopes; while > 0, persisting is deferred to flush()
+        self._ingest_depth = 0
+        self._needs_persist = False
+        # Ingests can run concurrently (the API calls them from worker threads): _state_lock
+        # guards _seen_hashes, _pending_hashes, _needs_persist and _ingest_depth;
+        # _flush_lock serializes flushes
+        self._state_lock = threading.Lock()
+        self._pending_hashes = set()
+        self._flush_lock = threading.Lock()
+        # Chunk hashes already embedded, so re-ingested text is skipped before the model runs
+        self._seen_hashes = self._seed_seen_hashes()
         
         # Initialize QA chain
         self.qa_chain = None
@@ -172,60 +294,183 @@ class PressureValveAgent:
             logger.error(f"Error initializing vector store: {e}")
             return None
     
+    def _seed_seen_hashes(self) -> set:
+        """
+        Build the chunk-hash set from the collection itself, so it always matches what is stored.
+        Ids written by ingest_documents are the hex hash; chunks stored under other ids
+        (e.g. uuids from older versions) have their text hashed instead.
+        """
+        if not self.vectorstore:
+            return set()
+        collection = self.vectorstore._collection
+        hashes = set()
+        offset = 0
+        while True:
+            page = collection.get(include=["documents"], limit=SEED_HASHES_BATCH, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                break
+            for cid, text in zip(ids, page.get("documents") or [None] * len(ids)):
+                h = _hash_from_id(cid)
+                if h is None and text is not None:
+                    h = xxhash.xxh3_64_intdigest(text.encode("utf-8"))
+                if h is not None:
+                    hashes.add(h)
+            offset += len(ids)
+        logger.info(f"Seeded {len(hashes)} chunk hashes from the vector store")
+        return hashes
+    
     def _setup_qa_chain(self):
         """Setup the question-answering chain"""
         try:
             self.qa_chain = RetrievalQA.from_chain_type(
                 llm=self.llm,
                 chain_type="stuff",
-                retriever=self.vectorstore.as_retriever(search_kwargs={"k": 3}),
+                retriever=self.vectorstore.as_retriever(search_kwargs={"k": RETRIEVAL_K}),
                 return_source_documents=True
             )
             logger.info("QA chain setup complete")
         except Exception as e:
             logger.error(f"Error setting up QA chain: {e}")
     
-    def ingest_documents(self, documents: List[str], metadata: Optional[List[Dict]] = None):
+    def ingest_documents(
+        self,
+        documents: Iterable[str],
+        metadata: Optional[Union[List[Dict], Dict]] = None
+    ) -> int:
         """
         Ingest documents into the vector store
         
         Args:
-            documents: List of document texts
-            metadata: Optional list of metadata dictionaries for each document
+            documents: Document texts (any iterable; consumed in batches)
+            metadata: Optional list of metadata dictionaries for each document,
+                or a single dictionary shared by all documents
+            
+        Returns:
+            Number of documents ingested
         """
         try:
-            logger.info(f"Ingesting {len(documents)} documents...")
+            logger.info("Ingesting documents...")
             
-            # Split documents into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len
-            )
+            shared_meta = metadata if isinstance(metadata, dict) else None
+            doc_count = 0
+            chunk_count = 0
+            skipped = 0
+            doc_iter = iter(documents)
+            while True:
+                batch = list(islice(doc_iter, INGEST_BATCH_DOCS))
+                if not batch:
+                    break
+                if shared_meta is not None:
+                    metadatas = [shared_meta] * len(batch)
+                else:
+                    metadatas = [
+                        metadata[i] if metadata and i < len(metadata) else {}
+                        for i in range(doc_count, doc_count + len(batch))
+                    ]
+                doc_count += len(batch)
+                
+                # Split documents into chunk Documents in one batched call
+                docs = self._text_splitter.create_documents(batch, metadatas=metadatas)
+                
+                # Drop chunks whose text is already stored (or repeated within this batch).
+                # New hashes are claimed as pending under the lock, so a concurrent ingest of
+                # the same text skips it instead of embedding it twice; they only count as
+                # stored once the collection write succeeds.
+                doc_hashes = [xxhash.xxh3_64_intdigest(d.page_content.encode("utf-8")) for d in docs]
+                hashes = []
+                fresh = []
+                with self._state_lock:
+                    for h, d in zip(doc_hashes, docs):
+                        if h in self._seen_hashes or h in self._pending_hashes:
+                            continue
+                        self._pending_hashes.add(h)
+                        hashes.append(h)
+                        fresh.append(d)
+                skipped += len(docs) - len(fresh)
+                if not fresh:
+                    continue
+                
+                # Embed all chunks in batched forward passes, then write the precomputed
+                # vectors straight to the collection under content-derived ids
+                try:
+                    texts = [d.page_content for d in fresh]
+                    vectors = self.embeddings.embed_documents(texts)
+                    self.vectorstore._collection.add(
+                        ids=[f"{h:016x}" for h in hashes],
+                        embeddings=vectors,
+                        documents=texts,
+                        metadatas=[d.metadata or None for d in fresh]
+                    )
+                except Exception:
+                    with self._state_lock:
+                        self._pending_hashes.difference_update(hashes)
+                    raise
+                with self._state_lock:
+                    self._pending_hashes.difference_update(hashes)
+                    self._seen_hashes.update(hashes)
+                chunk_count += len(fresh)
             
-            # Create Document objects
-            docs = []
-            for i, doc_text in enumerate(documents):
-                meta = metadata[i] if metadata and i < len(metadata) else {}
-                chunks = text_splitter.split_text(doc_text)
-                for chunk in chunks:
-                    docs.append(Document(page_content=chunk, metadata=meta))
+            if skipped:
+                logger.info(f"Skipped {skipped} duplicate chunks")
             
             # Add to vector store
-            if docs:
-                self.vectorstore.add_documents(docs)
-                self.vectorstore.persist()
-                logger.info(f"Successfully ingested {len(docs)} document chunks")
+            if chunk_count:
+                with self._state_lock:
+                    self._needs_persist = True
+                    flush_now = not self._ingest_depth
+                if flush_now:
+                    self.flush()
+                logger.info(f"Successfully ingested {chunk_count} chunks from {doc_count} documents")
                 
                 # Recreate QA chain with updated vectorstore
                 self._setup_qa_chain()
             else:
                 logger.warning("No documents to ingest")
+            
+            return doc_count
                 
         except Exception as e:
             logger.error(f"Error ingesting documents: {e}")
             raise
     
+    def flush(self):
+        """
+        Persist the vector store if anything was ingested since the last flush
+        """
+        with self._flush_lock:
+            with self._state_lock:
+                if not (self.vectorstore and self._needs_persist):
+                    return
+                self._needs_persist = False
+            try:
+                self.vectorstore.persist()
+            except Exception:
+                with self._state_lock:
+                    self._needs_persist = True
+                raise
+    
+    @contextmanager
+    def ingest_session(self):
+        """
+        Defer persisting across several ingest calls and flush once on exit
+        
+        Example:
+            with agent.ingest_session():
+                agent.ingest_documents(docs_a)
+                agent.ingest_documents(docs_b)
+        """
+        with self._state_lock:
+            self._ingest_depth += 1
+        try:
+            yield self
+        finally:
+            with self._state_lock:
+                self._ingest_depth -= 1
+                flush_now = not self._ingest_depth
+            if flush_now:
+                self.flush()
+    
     def ingest_file(self, file_path: str):
         """
         Ingest a single file into the knowledge base
@@ -273,12 +518,14 @@ class PressureValveAgent:
                     "source_documents": []
                 }
             
-            # Query the knowledge base
-            result = self.qa_chain({"query": question})
+            # Retrieve with the cached query embedding, then run only the answer step of the chain
+            embedding = self._embed_query(question)
+            docs = self.vectorstore.similarity_search_by_vector(list(embedding), k=RETRIEVAL_K)
+            answer = self.qa_chain.combine_documents_chain.run(input_documents=docs, question=question)
             
             return {
-                "answer": result.get("result", ""),
-                "source_documents": result.get("source_documents", [])
+                "answer": answer,
+                "source_documents": docs
             }
             
         except Exception as e:
@@ -288,6 +535,10 @@ class PressureValveAgent:
                 "source_documents": []
             }
     
+    def _embed_query_uncached(self, question: str) -> tuple:
+        """Embed a query; wrapped per instance by an LRU cache in __init__"""
+        return tuple(self.embeddings.embed_query(question))
+    
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the knowledge base"""
         try:
@@ -309,9 +560,20 @@ class PressureValveAgent:
             return {}
 
 
+def _hash_from_id(chunk_id: str) -> Optional[int]:
+    """Recover the xxh3 hash from a content-derived chunk id, or None for any other id"""
+    if len(chunk_id) != 16:
+        return None
+    try:
+        return int(chunk_id, 16)
+    except ValueError:
+        return None
+
+
 def create_agent(
     model_name: str = "gpt2",
-    embeddings_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embeddings_model: str = "sentence-transformers/all-MiniLM-L6-v2",
+    embeddings_backend: Optional[str] = None
 ) -> PressureValveAgent:
     """
     Factory function to create a Pressure Valve Agent
@@ -319,11 +581,13 @@ def create_agent(
     Args:
         model_name: Name of the language model to use
         embeddings_model: Name of the embeddings model to use
+        embeddings_backend: "hf" or "onnx-int8" (defaults to the EMBEDDINGS_BACKEND env var, else "hf")
         
     Returns:
         Initialized PressureValveAgent instance
     """
     return PressureValveAgent(
         model_name=model_name,
-        embeddings_model=embeddings_model
+        embeddings_model=embeddings_model,
+        embeddings_backend=embeddings_backend or os.getenv("EMBEDDINGS_BACKEND", "hf")
     )
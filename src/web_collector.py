@@ -5,16 +5,41 @@ Gathers relevant data about pressure relief valves from the internet
 """
 
 import os
+import gzip
+import hashlib
 import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlsplit
 import time
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
 
 logger = logging.getLogger(__name__)
 
+# Concurrent page fetches in collect_valve_information
+FETCH_WORKERS = 8
+# Minimum seconds between requests to the same host
+HOST_DELAY_SECONDS = 2.0
+# Cached page text older than this is fetched again
+CACHE_TTL_SECONDS = 7 * 86400
+# Transient failures (connection errors, 429/5xx) are retried with exponential backoff
+HTTP_RETRIES = 4
+HTTP_BACKOFF_FACTOR = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# DuckDuckGo HTML result markup, shared by every search_web call
+RESULT_SELECTOR = 'div.result'
+RESULT_TITLE_SELECTOR = 'a.result__a'
+RESULT_SNIPPET_SELECTOR = 'a.result__snippet'
+# Page chrome dropped before extracting text in fetch_url_content
+BOILERPLATE_SELECTOR = 'script, style, nav, footer, header'
+
 
 class WebDataCollector:
     """
@@ -35,6 +60,69 @@ class WebDataCollector:
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        
+        # Per-host politeness: earliest time the next request to each host may start
+        self._host_next = defaultdict(float)
+        self._host_lock = threading.Lock()
+        
+        # One pooled session so keep-alive connections (and TLS sessions) are reused,
+        # retrying transient failures instead of dropping the page
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retry = Retry(
+            total=HTTP_RETRIES,
+            backoff_factor=HTTP_BACKOFF_FACTOR,
+            status_forcelist=HTTP_RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            # Hand the last response back so raise_for_status reports the real status
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=16, pool_maxsize=32)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+    
+    def _wait_for_host(self, url: str):
+        """Block until a request to this URL's host is allowed, reserving the next slot"""
+        host = urlsplit(url).netloc
+        with self._host_lock:
+            now = time.monotonic()
+            start = max(now, self._host_next[host])
+            self._host_next[host] = start + HOST_DELAY_SECONDS
+        if start > now:
+            time.sleep(start - now)
+    
+    def _polite_fetch(self, url: str) -> Optional[str]:
+        # Cache hits need no network request, so they skip the host delay too
+        cached = self._read_cache(url)
+        if cached is not None:
+            return cached
+        self._wait_for_host(url)
+        return self.fetch_url_content(url)
+    
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.txt.gz')
+    
+    def _read_cache(self, url: str) -> Optional[str]:
+        """Return cached page text for a URL if a fresh copy exists"""
+        path = self._cache_path(url)
+        try:
+            if time.time() - os.stat(path).st_mtime >= CACHE_TTL_SECONDS:
+                return None
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return f.read()
+        except (OSError, EOFError):
+            return None
+    
+    def _write_cache(self, url: str, content: str):
+        path = self._cache_path(url)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                f.write(content)
+            # Atomic rename so concurrent readers never see a partial file
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache {url}: {e}")
     
     def search_web(self, query: str, max_results: int = 5) -> List[Dict[str, str]]:
         """
@@ -60,22 +148,24 @@ class WebDataCollector:
             encoded_query = quote_plus(query)
             url = f"https://html.duckduckgo.com/html/?q={encoded_query}"
             
-            response = requests.get(url, headers=self.headers, timeout=10)
+            # Shares the per-host slot with page fetches, so back-to-back topic searches are spaced out
+            self._wait_for_host(url)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            tree = LexborHTMLParser(response.content)
             
             # Parse search results
-            result_divs = soup.find_all('div', class_='result')[:max_results]
+            result_divs = tree.css(RESULT_SELECTOR)[:max_results]
             
             for div in result_divs:
-                title_elem = div.find('a', class_='result__a')
+                title_elem = div.css_first(RESULT_TITLE_SELECTOR)
                 if title_elem:
-                    title = title_elem.get_text(strip=True)
-                    link = title_elem.get('href', '')
+                    title = title_elem.text(strip=True)
+                    link = title_elem.attributes.get('href') or ''
                     
-                    snippet_elem = div.find('a', class_='result__snippet')
-                    snippet = snippet_elem.get_text(strip=True) if snippet_elem else ''
+                    snippet_elem = div.css_first(RESULT_SNIPPET_SELECTOR)
+                    snippet = snippet_elem.text(strip=True) if snippet_elem else ''
                     
                     results.append({
                         'title': title,
@@ -100,26 +190,32 @@ class WebDataCollector:
         Returns:
             Text content of the page, or None if failed
         """
+        cached = self._read_cache(url)
+        if cached is not None:
+            logger.info(f"Using cached content for: {url}")
+            return cached
+        
         try:
             logger.info(f"Fetching content from: {url}")
             
-            response = requests.get(url, headers=self.headers, timeout=15)
+            response = self.session.get(url, timeout=15)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            tree = LexborHTMLParser(response.content)
             
             # Remove script and style elements
-            for script in soup(['script', 'style', 'nav', 'footer', 'header']):
-                script.decompose()
+            for node in tree.css(BOILERPLATE_SELECTOR):
+                node.decompose()
             
             # Get text
-            text = soup.get_text(separator='\n', strip=True)
+            text = tree.root.text(separator='\n', strip=True) if tree.root else ''
             
-            # Clean up text
-            lines = [line.strip() for line in text.split('\n') if line.strip()]
-            content = '\n'.join(lines)
+            # Clean up text: strip each line and drop blank ones; map/filter keep the
+            # per-line work in C (faster than a regex substitution on typical page text)
+            content = '\n'.join(filter(None, map(str.strip, text.split('\n'))))
             
             logger.info(f"Fetched {len(content)} characters")
+            self._write_cache(url, content)
             return content
             
         except Exception as e:
@@ -147,24 +243,22 @@ class WebDataCollector:
         
         documents = []
         
+        # Search every topic first, then fetch all result pages concurrently
+        results = []
         for topic in topics:
             logger.info(f"Collecting information on: {topic}")
+            results.extend(r for r in self.search_web(topic, max_results=3) if r.get('url'))
+        
+        if results:
+            # Rate limiting is per host, so different sites are fetched in parallel
+            with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+                contents = list(executor.map(self._polite_fetch, [r['url'] for r in results]))
             
-            # Search for the topic
-            results = self.search_web(topic, max_results=3)
-            
-            # Fetch content from top results
-            for result in results:
-                url = result.get('url', '')
-                if url:
-                    content = self.fetch_url_content(url)
-                    if content and len(content) > 500:
-                        # Create a document with metadata
-                        doc = f"Source: {result['title']}\nURL: {url}\n\n{content}"
-                        documents.append(doc)
-                    
-                    # Be respectful with rate limiting
-                    time.sleep(2)
+            for result, content in zip(results, contents):
+                if content and len(content) > 500:
+                    # Create a document with metadata
+                    doc = f"Source: {result['title']}\nURL: {result['url']}\n\n{content}"
+                    documents.append(doc)
         
         logger.info(f"Collected {len(documents)} documents from the web")
         return documents